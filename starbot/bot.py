@@ -2,7 +2,7 @@ import ast
 import logging
 import sys
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Awaitable, Callable, Optional
 
 import arrow
 from aiohttp import ClientSession
@@ -28,6 +28,7 @@ class StarBot(InteractionBot):
 
         self.start_time = arrow.utcnow()
         self.all_modules: list[str] = []
+        self.shutdown_hooks: list[Callable[[], Awaitable[None]]] = []
 
         self.engine = create_async_engine(DATABASE_URL)
         self.Session = sessionmaker(self.engine, expire_on_commit=False, class_=AsyncSession)
@@ -109,6 +110,16 @@ class StarBot(InteractionBot):
 
         logger.exception(f"Error in {event_method!r}. Args: {args}, kwargs: {kwargs}")
 
+    async def close(self) -> None:
+        """Run the shutdown hooks, then close the connection to Discord."""
+        for hook in self.shutdown_hooks:
+            try:
+                await hook()
+            except Exception:
+                logger.exception(f"Error in shutdown hook {hook!r}")
+
+        await super().close()
+
     @classmethod
     def new(cls) -> "StarBot":
         """Generate a populated StarBot instance."""
@@ -52,6 +52,30 @@ class GuildConfig(ConfigABC):
         dm: str
         bypass_permission: disnake.Permissions
 
+        class perms(ConfigABC):
+            role: Optional[int]
+            discord: Optional[disnake.Permissions]
+
+    class anti_raid(ConfigABC):
+        enabled: bool
+        window: int
+        join_threshold: int
+        new_account_threshold: int
+        new_account_age: str
+        cooldown: int
+        alert_channel: Optional[int]
+        pause_auto_role: bool
+        quarantine_role: Optional[int]
+
+    class spam(ConfigABC):
+        enabled: bool
+        window: int
+        duplicate_threshold: int
+        similarity_distance: int
+        action: str
+        mute_duration: int
+        bypass_permission: disnake.Permissions
+
     class colors(ConfigABC):
         danger: int
         warning: int
@@ -25,5 +25,21 @@ GIT_SHA = os.getenv("GIT_SHA", "unknown")
 
 LOGGING_LEVEL = os.getenv("LOGGING_LEVEL", "DEBUG" if DEBUG else "INFO")
 
+# Seconds during which log messages are buffered before being sent to the log channels
+LOG_FLUSH_DELAY = float(os.getenv("LOG_FLUSH_DELAY", "2"))
+# Memory, in bytes, used to keep recent messages for delete and edit logs
+MESSAGE_STORE_BUDGET = int(os.getenv("MESSAGE_STORE_BUDGET", str(32 * 1024 * 1024)))
+# Directory where every logged event is also written as JSONL, disabled if not set
+EVENT_SINK_PATH = os.getenv("EVENT_SINK_PATH", None)
+# Days of event files kept on disk, older files are deleted
+EVENT_SINK_RETENTION = int(os.getenv("EVENT_SINK_RETENTION", "30"))
+# Also lock infractions with Postgres advisory locks, when running several bot processes
+ADVISORY_LOCKS = os.getenv("ADVISORY_LOCKS", None) is not None
+
+# Maximum number of messages Discord accepts in a single bulk delete
+BULK_DELETE_LIMIT = 100
+# The gzip compressor holds back some output, keep that much room under the upload size limits
+COMPRESSION_MARGIN = 256 * 1024
+
 # Typing aliases
 ACI = ApplicationCommandInteraction
@@ -0,0 +1,75 @@
+"""Add infraction rollups
+
+Revision ID: 8d2f6b1c4a93
+Revises: 3c9a51f2e7d4
+Create Date: 2026-10-19 14:03:11.204518
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "8d2f6b1c4a93"
+down_revision = "3c9a51f2e7d4"
+branch_labels = None
+depends_on = None
+
+# The enum is already created by the infraction table
+infraction_types = postgresql.ENUM(
+    "NOTE", "WARNING", "MUTE", "KICK", "BAN", name="infractiontypes", create_type=False
+)
+
+
+def upgrade():
+    op.create_table(
+        "infraction_rollup",
+        sa.Column("guild_id", sa.BigInteger(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("type", infraction_types, nullable=False),
+        sa.Column("moderator_id", sa.BigInteger(), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["guild_id"],
+            ["guild.guild_id"],
+        ),
+        sa.PrimaryKeyConstraint("guild_id", "day", "type", "moderator_id"),
+    )
+    op.create_table(
+        "infraction_user_rollup",
+        sa.Column("guild_id", sa.BigInteger(), nullable=False),
+        sa.Column("user_id", sa.BigInteger(), nullable=False),
+        sa.Column("type", infraction_types, nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.Column("last_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["guild_id"],
+            ["guild.guild_id"],
+        ),
+        sa.PrimaryKeyConstraint("guild_id", "user_id", "type"),
+    )
+
+    # Backfill the rollups from the existing infractions
+    op.execute(
+        """
+        INSERT INTO infraction_rollup (guild_id, day, type, moderator_id, count)
+        SELECT guild_id, CAST(created_at AS DATE), type, COALESCE(moderator_id, 0), COUNT(*)
+        FROM infraction
+        WHERE type IS NOT NULL
+        GROUP BY guild_id, CAST(created_at AS DATE), type, COALESCE(moderator_id, 0)
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO infraction_user_rollup (guild_id, user_id, type, count, last_at)
+        SELECT guild_id, user_id, type, COUNT(*), MAX(created_at)
+        FROM infraction
+        WHERE type IS NOT NULL AND user_id IS NOT NULL
+        GROUP BY guild_id, user_id, type
+        """
+    )
+
+
+def downgrade():
+    op.drop_table("infraction_user_rollup")
+    op.drop_table("infraction_rollup")
@@ -1,4 +1,9 @@
 from starbot.models.config_entry import ConfigEntryModel  # noqa: F401
 from starbot.models.guild import GuildModel  # noqa: F401
 from starbot.models.infraction import InfractionModel  # noqa: F401
+from starbot.models.infraction_rollup import (  # noqa: F401
+    InfractionRollupModel,
+    InfractionUserRollupModel,
+)
+from starbot.models.phishing_domain import PhishingDomainModel  # noqa: F401
 from starbot.models.role_picker import RolePickerEntryModel, RolePickerModel  # noqa: F401
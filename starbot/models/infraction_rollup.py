@@ -0,0 +1,42 @@
+import sqlalchemy
+from sqlalchemy import BigInteger, Column, Date, DateTime, ForeignKey, Integer
+from sqlalchemy.orm import relationship
+
+from starbot.models._base import Base
+from starbot.models.infraction import InfractionTypes
+
+
+class InfractionRollupModel(Base):
+    """Number of infractions of a type given by a moderator on a single day."""
+
+    __tablename__ = "infraction_rollup"
+
+    guild_id = Column(BigInteger, ForeignKey("guild.guild_id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    type = Column(sqlalchemy.Enum(InfractionTypes), primary_key=True)
+    moderator_id = Column(BigInteger, primary_key=True)
+
+    count = Column(Integer, nullable=False, default=0)
+
+    guild = relationship("GuildModel")
+
+    def __str__(self) -> str:
+        return f"<InfractionRollupModel {self.guild_id} {self.day} {self.type} {self.moderator_id}>"
+
+
+class InfractionUserRollupModel(Base):
+    """Number of infractions of a type received by a user."""
+
+    __tablename__ = "infraction_user_rollup"
+
+    guild_id = Column(BigInteger, ForeignKey("guild.guild_id"), primary_key=True)
+    user_id = Column(BigInteger, primary_key=True)
+    type = Column(sqlalchemy.Enum(InfractionTypes), primary_key=True)
+
+    count = Column(Integer, nullable=False, default=0)
+    last_at = Column(DateTime, nullable=False)
+
+    guild = relationship("GuildModel")
+
+    def __str__(self) -> str:
+        return f"<InfractionUserRollupModel {self.guild_id} {self.user_id} {self.type}>"
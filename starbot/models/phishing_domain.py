@@ -0,0 +1,22 @@
+from sqlalchemy import BigInteger, Boolean, Column, ForeignKey, Integer, String, UniqueConstraint
+from sqlalchemy.orm import relationship
+
+from starbot.models._base import Base
+
+
+class PhishingDomainModel(Base):
+    """A domain blocked or allowed by a guild, on top of the global phishing list."""
+
+    __tablename__ = "phishing_domain"
+    __table_args__ = (UniqueConstraint("guild_id", "domain"),)
+
+    id = Column(Integer, primary_key=True)
+    guild_id = Column(BigInteger, ForeignKey("guild.guild_id"), nullable=False)
+
+    domain = Column(String(255), nullable=False)
+    allowed = Column(Boolean, nullable=False)
+
+    guild = relationship("GuildModel")
+
+    def __str__(self) -> str:
+        return f"<PhishingDomainModel(guild_id={self.guild_id}, {self.domain}={self.allowed})>"
@@ -0,0 +1,77 @@
+import unicodedata
+from collections import Counter
+from hashlib import blake2b
+from typing import NamedTuple
+
+# Only the start of long messages is fingerprinted, which is enough to tell them apart
+MAX_FINGERPRINT_LENGTH = 2000
+# Length of the character shingles hashed into the simhash
+SHINGLE_SIZE = 4
+
+HASH_BITS = 64
+HASH_BYTES = HASH_BITS // 8
+
+
+class Fingerprint(NamedTuple):
+    """The fingerprints of a message content."""
+
+    # Exact hash of the normalized content
+    hash: int
+    # Similar contents have simhashes differing by a few bits
+    simhash: int
+
+
+def normalize(content: str) -> str:
+    """
+    Normalize a message content, so trivial variations of it compare equal.
+
+    The content is case folded, invisible characters and punctuation are removed,
+    and whitespace is collapsed.
+    """
+    content = unicodedata.normalize("NFKC", content[: MAX_FINGERPRINT_LENGTH * 2]).casefold()
+    kept = "".join(
+        char if char.isalnum() else " " for char in content if unicodedata.category(char) != "Cf"
+    )
+    return " ".join(kept.split())[:MAX_FINGERPRINT_LENGTH]
+
+
+def _hash(data: str) -> bytes:
+    return blake2b(data.encode(), digest_size=HASH_BYTES).digest()
+
+
+def simhash(content: str) -> int:
+    """
+    Compute the 64 bits simhash of a normalized content, over its character shingles.
+
+    Each bit of the result is set if it is set in the hash of most shingles.
+    """
+    shingles = {
+        content[i : i + SHINGLE_SIZE] for i in range(max(1, len(content) - SHINGLE_SIZE + 1))
+    }
+    hashes = b"".join(_hash(shingle) for shingle in shingles)
+
+    # Count the bits set at each position, one byte column at a time
+    result = 0
+    for column in range(HASH_BYTES):
+        counts = [0] * 8
+
+        for value, count in Counter(hashes[column::HASH_BYTES]).items():
+            for bit in range(8):
+                if value >> bit & 1:
+                    counts[bit] += count
+
+        for bit, count in enumerate(counts):
+            if count * 2 > len(shingles):
+                result |= 1 << (column * 8 + bit)
+
+    return result
+
+
+def fingerprint(content: str) -> Fingerprint:
+    """Fingerprint a normalized content."""
+    return Fingerprint(int.from_bytes(_hash(content), "little"), simhash(content))
+
+
+def distance(first: int, second: int) -> int:
+    """Return the number of bits differing between two simhashes."""
+    return (first ^ second).bit_count()
@@ -0,0 +1,218 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from typing import Optional
+
+import arrow
+import websockets
+from aiohttp import ClientError, ClientSession, ClientTimeout
+from websockets.exceptions import WebSocketException
+
+# Scam list API
+API_ALL = "https://phish.sinking.yachts/v2/all"
+API_WS = "wss://phish.sinking.yachts/feed"
+
+# Reconnection delays, in seconds, before the jitter is applied
+BACKOFF_BASE = 1
+BACKOFF_MAX = 300
+# A connection staying up for that many seconds resets the backoff
+BACKOFF_RESET = 60
+
+# Seconds without any message before the connection is probed with a ping
+STALE_AFTER = 120
+# Seconds to wait for the pong before considering the connection dead
+HEARTBEAT_TIMEOUT = 15
+
+# Disconnections longer than this many seconds trigger a resync against the full list
+RESYNC_THRESHOLD = 60
+RESYNC_TIMEOUT = ClientTimeout(total=30)
+# Delays, in seconds, between the attempts of a failed resync, before the jitter is applied
+RESYNC_RETRY_BASE = 5
+RESYNC_RETRY_MAX = 600
+
+logger = logging.getLogger(__name__)
+
+
+class PhishingFeed:
+    """
+    Keep a set of phishing domains in sync with the SinkingYachts API.
+
+    The full list is fetched on startup, then changes are received through the websocket feed.
+    Changes missed while the feed was disconnected for too long are recovered by diffing
+    the set against the full list.
+    """
+
+    def __init__(
+        self, session: ClientSession, headers: dict[str, str], full_resync: bool = True
+    ) -> None:
+        self.session = session
+        self.headers = headers
+        self.full_resync = full_resync
+
+        self.domains: set[str] = set()
+        self.ready = False
+        self.needs_resync = full_resync
+        self._resync_task: Optional[asyncio.Task] = None
+
+        # Health metrics
+        self.connected = False
+        self.disconnected_since = time.monotonic()
+        self.last_update: Optional[arrow.Arrow] = None
+        self.reconnections = 0
+        self.resyncs = 0
+        self.failed_attempts = 0
+
+    @property
+    def lag(self) -> float:
+        """Number of seconds during which changes to the list may have been missed."""
+        if self.connected:
+            return 0.0
+        return time.monotonic() - self.disconnected_since
+
+    def apply(self, data: dict) -> None:
+        """Apply a change received from the feed."""
+        match data["type"]:
+            case "add":
+                function = self.domains.add
+            case "delete":
+                function = self.domains.discard
+            case _:
+                logger.warning(f"Unknown message type: {data['type']}")
+                return
+
+        logger.debug(f"{data['type'].rstrip('e')}ing {data['domains']} from the domain list")
+
+        for domain in data["domains"]:
+            function(domain)
+
+        self.last_update = arrow.utcnow()
+
+    async def resync(self) -> bool:
+        """
+        Diff the domain set against the full list.
+
+        The set is updated in place. Returns whether the resync succeeded.
+        """
+        logger.debug("Resyncing phishing links...")
+
+        try:
+            async with self.session.get(
+                API_ALL, headers=self.headers, timeout=RESYNC_TIMEOUT
+            ) as resp:
+                resp.raise_for_status()
+                domains = set(await resp.json())
+        except (ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Failed to fetch the full phishing list: {e!r}")
+            return False
+
+        added = domains - self.domains
+        removed = self.domains - domains
+
+        self.domains -= removed
+        self.domains |= added
+
+        self.needs_resync = False
+        self.resyncs += 1
+        self.last_update = arrow.utcnow()
+
+        if not self.ready:
+            self.ready = True
+            logger.info("Phishing link detection ready.")
+        else:
+            logger.info(f"Resynced phishing links: {len(added)} added, {len(removed)} removed.")
+
+        return True
+
+    async def run(self) -> None:
+        """Keep the domain set up to date until cancelled."""
+        if self.full_resync:
+            self.request_resync()
+
+        try:
+            while True:
+                connected_at = time.monotonic()
+
+                try:
+                    async with websockets.connect(
+                        API_WS, extra_headers=self.headers, ping_interval=None
+                    ) as ws:
+                        self._on_connect()
+                        await self._consume(ws)
+                except (OSError, WebSocketException, asyncio.TimeoutError) as e:
+                    logger.info(f"Connection to the domain feed lost: {e!r}")
+
+                self._on_disconnect(time.monotonic() - connected_at)
+
+                delay = random.uniform(
+                    0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** self.failed_attempts)
+                )
+                logger.debug(f"Reconnecting to the domain feed in {delay:.1f}s.")
+                await asyncio.sleep(delay)
+        finally:
+            if self._resync_task:
+                self._resync_task.cancel()
+
+    def request_resync(self) -> None:
+        """Resync the list in the background, retrying until it succeeds."""
+        self.needs_resync = True
+
+        if self._resync_task is None or self._resync_task.done():
+            self._resync_task = asyncio.create_task(self._resync_until_done())
+
+    async def _resync_until_done(self) -> None:
+        """Retry the resync with an exponential backoff, without waiting for a reconnection."""
+        attempts = 0
+
+        while not await self.resync():
+            delay = random.uniform(0, min(RESYNC_RETRY_MAX, RESYNC_RETRY_BASE * 2 ** attempts))
+            attempts += 1
+
+            logger.debug(f"Retrying the phishing list resync in {delay:.1f}s.")
+            await asyncio.sleep(delay)
+
+    def _on_connect(self) -> None:
+        """Update the metrics and resync the list if the gap was too long."""
+        gap = self.lag
+
+        self.connected = True
+        self.reconnections += 1
+
+        logger.debug(
+            f"Connected to the domain feed (connection #{self.reconnections}, "
+            f"{self.resyncs} resyncs, last update {self.last_update}, lag {gap:.0f}s)."
+        )
+
+        if self.full_resync and (self.needs_resync or gap > RESYNC_THRESHOLD):
+            logger.info(f"Domain feed was unavailable for {gap:.0f}s, resyncing.")
+            self.request_resync()
+
+    def _on_disconnect(self, uptime: float) -> None:
+        """Update the metrics after the connection was lost."""
+        if self.connected:
+            self.disconnected_since = time.monotonic()
+
+        self.connected = False
+
+        if uptime > BACKOFF_RESET:
+            self.failed_attempts = 0
+        else:
+            self.failed_attempts += 1
+
+    async def _consume(self, ws: websockets.WebSocketClientProtocol) -> None:
+        """Apply the changes received through the websocket, probing it when it goes quiet."""
+        while True:
+            try:
+                message = await asyncio.wait_for(ws.recv(), timeout=STALE_AFTER)
+            except asyncio.TimeoutError:
+                # Nothing received for a while, make sure the connection is still alive
+                pong = await ws.ping()
+                await asyncio.wait_for(pong, timeout=HEARTBEAT_TIMEOUT)
+                continue
+
+            try:
+                self.apply(json.loads(message))
+            except (json.JSONDecodeError, KeyError, TypeError) as e:
+                # A single malformed message must not bring the feed down
+                logger.warning(f"Ignoring a malformed message from the domain feed: {e!r}")
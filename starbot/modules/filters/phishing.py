@@ -1,25 +1,35 @@
-import json
+import asyncio
 import logging
-import re
+import time
+from collections import defaultdict
 from contextlib import suppress
 from string import Template
-
-import websockets
-from disnake import Forbidden, Member, Message, NotFound
-from disnake.ext.commands import Cog
-from websockets.exceptions import ConnectionClosed
+from typing import Optional
+
+from disnake import (
+    Forbidden,
+    HTTPException,
+    Member,
+    Message,
+    NotFound,
+    PartialMessage,
+    RawMessageUpdateEvent,
+    TextChannel,
+    Thread,
+    User,
+)
+from disnake.ext.commands import Cog, slash_command
+from sqlalchemy import and_, delete, select
+from sqlalchemy.dialects.postgresql import insert
 
 from starbot.bot import StarBot
-from starbot.constants import DEBUG, GIT_SHA
-
-# Scam list API
+from starbot.checks import require_permission
+from starbot.constants import ACI, BULK_DELETE_LIMIT, DEBUG, GIT_SHA
 from starbot.exceptions import GuildNotConfiguredError
-
-API_ALL = "https://phish.sinking.yachts/v2/all"
-API_WS = "wss://phish.sinking.yachts/feed"
-
-# Domain regex
-DOMAIN_REGEX = re.compile(r"(?i)\b((?:[a-z0-9][-a-z0-9]*[a-z0-9]\.)+[a-z][-a-z0-9]{0,22}[a-z0])")
+from starbot.models import PhishingDomainModel
+from starbot.modules.filters._phishing_feed import PhishingFeed
+from starbot.utils.domains import DOMAIN_REGEX, DomainMatcher, changed_span
+from starbot.utils.paginator import PaginatorView
 
 # Useful formatting links
 LINK_PASSWORD = (
@@ -30,6 +40,14 @@ LINK_2FA = (
     "https://support.discord.com/hc/en-us/articles/219576828-Setting-up-Two-Factor-Authentication"
 )
 
+# Seconds during which further detections from the same user reuse the first action
+COALESCE_WINDOW = 30
+# Seconds to wait for more messages in a channel before bulk deleting them
+DELETION_DELAY = 2
+
+BLOCKED_EMOJI = "\N{NO ENTRY SIGN}"
+ALLOWED_EMOJI = "\N{WHITE HEAVY CHECK MARK}"
+
 
 logger = logging.getLogger(__name__)
 
@@ -43,126 +61,293 @@ class Phishing(Cog):
 
     def __init__(self, bot: StarBot) -> None:
         self.bot = bot
-        self.domains: set[str] = set()
-        self.ready = False
         self.headers = {"X-Identity": f"StarBot {self.bot.user} {GIT_SHA[:6]}"}
+        self.feed = PhishingFeed(self.bot.aiohttp, self.headers, full_resync=not DEBUG)
+        self.matcher = DomainMatcher(self.feed.domains)
 
-        self.bot.loop.create_task(self.consume_feed())
+        # (guild ID, user ID) mapped to the monotonic time the action was taken
+        self.recent_actions: dict[tuple[int, int], float] = {}
+        # Channel ID mapped to the messages waiting to be bulk deleted
+        self.pending_deletions: defaultdict[int, list[Message | PartialMessage]] = defaultdict(list)
+        self.deletion_tasks: dict[int, asyncio.Task] = {}
 
-        if not DEBUG:
-            self.bot.loop.create_task(self.populate_domains())
-        else:
+        self.feed_task = self.bot.loop.create_task(self.feed.run())
+        self.bot.loop.create_task(self.load_guild_domains())
+
+        if DEBUG:
             logger.warning(
                 "Phishing link detection disabled in debug mode. Adding scam.com to the list."
             )
-            self.ready = True
-            self.domains = {"scam.com"}
+            self.feed.ready = True
+            self.feed.domains.add("scam.com")
+
+    def cog_unload(self) -> None:
+        """Stop consuming the domain feed."""
+        self.feed_task.cancel()
 
-    async def populate_domains(self) -> None:
-        """Populates the links set with phishing links."""
-        logger.debug("Populating phishing links...")
-        self.domains = set()
+    async def load_guild_domains(self) -> None:
+        """Load the domains blocked or allowed by each guild into the matcher."""
+        async with self.bot.Session() as session:
+            entries = await session.execute(select(PhishingDomainModel))
 
-        async with self.bot.aiohttp.get(API_ALL, headers=self.headers) as resp:
-            data = await resp.json()
+        for entry in entries:
+            self.matcher.set_domain(entry[0].guild_id, entry[0].domain, not entry[0].allowed)
 
-            for link in data:
-                self.domains.add(link)
+    def queue_deletion(self, message: Message | PartialMessage) -> None:
+        """Queue a message to be bulk deleted alongside the other messages of its channel."""
+        self.pending_deletions[message.channel.id].append(message)
+
+        if message.channel.id not in self.deletion_tasks:
+            self.deletion_tasks[message.channel.id] = self.bot.loop.create_task(
+                self.flush_deletions(message.channel)
+            )
 
-        self.ready = True
-        logger.info("Phishing link detection ready.")
+    async def flush_deletions(self, channel: TextChannel | Thread) -> None:
+        """Bulk delete the queued messages of that channel once the delay expired."""
+        await asyncio.sleep(DELETION_DELAY)
 
-    async def consume_feed(self) -> None:
-        """Connect to the domain feed and wait for changes."""
-        async for ws in websockets.connect(API_WS, extra_headers=self.headers):
+        self.deletion_tasks.pop(channel.id, None)
+        messages = self.pending_deletions.pop(channel.id, [])
+
+        for i in range(0, len(messages), BULK_DELETE_LIMIT):
             try:
-                async for message in ws:
-                    data = json.loads(message)
-
-                    match data["type"]:
-                        case "add":
-                            function = self.domains.add
-                        case "delete":
-                            function = self.domains.discard
-                        case _:
-                            logger.warning(f"Unknown message type: {data['type']}")
-                            continue
-
-                    logger.debug(
-                        f"{data['type'].rstrip('e')}ing {data['domains']} from the domain list"
-                    )
+                await channel.delete_messages(messages[i : i + BULK_DELETE_LIMIT])
+            except HTTPException as e:
+                logger.debug(f"Failed to bulk delete phishing messages in {channel}: {e}")
+
+    def should_coalesce(self, guild_id: int, user_id: int) -> bool:
+        """
+        Return True if an action was recently taken against that user.
+
+        Otherwise, the action is recorded so concurrent detections can be coalesced.
+        """
+        key = (guild_id, user_id)
+        now = time.monotonic()
+
+        if now - self.recent_actions.get(key, float("-inf")) < COALESCE_WINDOW:
+            return True
+
+        # Drop the expired entries so the mapping doesn't grow unbounded
+        self.recent_actions = {
+            key_: timestamp
+            for key_, timestamp in self.recent_actions.items()
+            if now - timestamp < COALESCE_WINDOW
+        }
+        self.recent_actions[key] = now
+        return False
+
+    def find_phishing_domain(self, text: str, guild_id: int) -> Optional[str]:
+        """Return the first domain found in the text that is blocked in that guild, if any."""
+        if not self.feed.ready:
+            return None
+
+        return self.matcher.find(text, guild_id)
+
+    async def take_action(
+        self, message: Message | PartialMessage, author: Member | User, domain: str
+    ) -> None:
+        """Delete the message and apply the configured action against its author."""
+        guild = message.channel.guild
 
-                    for domain in data["domains"]:
-                        function(domain)
-            except ConnectionClosed:
-                logger.info("Connection to the domain feed closed. Reconnecting...")
-                continue
+        try:
+            config = await self.bot.get_config(guild_id=guild.id)
+        except GuildNotConfiguredError:
+            return
+
+        if not config.phishing.should_filter:
+            return
+
+        logger.debug(f"Detected phishing link {domain!r} from {author}.")
+
+        if isinstance(author, Member) and message.channel.permissions_for(author).is_superset(
+            config.phishing.bypass_permission
+        ):
+            logger.debug(f"{author} will bypass the filter.")
+
+            with suppress(NotFound, Forbidden):
+                await message.add_reaction("\N{WARNING SIGN}")
+
+            return
+
+        # An action is already being taken against this user, only remove the message
+        if self.should_coalesce(guild.id, author.id):
+            logger.debug(f"Coalescing phishing link from {author}.")
+            self.queue_deletion(message)
+            return
+
+        with suppress(NotFound, Forbidden):
+            await message.delete()
+
+        match config.phishing.action:
+            case "ban":
+                action = f"You have been banned from {guild.name}."
+            case "kick":
+                action = f"You have been kicked from {guild.name}."
+            case "ignore":
+                action = ""
+            case _:
+                logger.error(f"Invalid phishing action {config.phishing.action}.")
+                return
+
+        dm_message = Template(config.phishing.dm).safe_substitute(
+            user=str(author),
+            action=action,
+            LINK_PASSWORD=LINK_PASSWORD,
+            LINK_2FA=LINK_2FA,
+        )
+
+        with suppress(NotFound, Forbidden):
+            await author.send(dm_message)
+
+        with suppress(Forbidden):
+            if isinstance(author, Member):
+                match config.phishing.action:
+                    case "ban":
+                        await author.ban(reason="Phishing link sent.")
+                    case "kick":
+                        await author.kick(reason="Phishing link sent.")
+                    case "ignore":
+                        pass
 
     @Cog.listener()
     async def on_message(self, message: Message) -> None:
         """Find phishing links in messages."""
-        try:
-            config = await self.bot.get_config(guild_id=message.guild.id)
-        except GuildNotConfiguredError:
+        if message.guild is None or message.author.bot:
             return
 
-        if not self.ready or not config.phishing.should_filter:
+        if domain := self.find_phishing_domain(message.content, message.guild.id):
+            await self.take_action(message, message.author, domain)
+
+    @Cog.listener()
+    async def on_raw_message_edit(self, payload: RawMessageUpdateEvent) -> None:
+        """
+        Find phishing links introduced by message edits.
+
+        When the previous content is cached, only the edited part of the message is scanned.
+        """
+        if payload.guild_id is None or "content" not in payload.data:
             return
 
-        if message.author.bot:
+        author_data = payload.data.get("author", {})
+        if "id" not in author_data or author_data.get("bot", False):
             return
 
-        for match in DOMAIN_REGEX.finditer(message.content):
-            domain = match.group(0)
+        content = payload.data["content"]
 
-            if domain in self.domains:
-                logger.debug(f"Detected phishing link {domain!r} from {message.author}.")
+        if payload.cached_message:
+            if payload.cached_message.content == content:
+                return
 
-                if message.channel.permissions_for(message.author).is_superset(
-                    config.phishing.bypass_permission
-                ):
-                    logger.debug(f"{message.author} will bypass the filter.")
+            content = changed_span(payload.cached_message.content, content)
 
-                    with suppress(Forbidden):
-                        await message.add_reaction("\N{WARNING SIGN}")
+        if not (domain := self.find_phishing_domain(content, payload.guild_id)):
+            return
 
-                    return
+        if not (guild := self.bot.get_guild(payload.guild_id)):
+            return
 
-                with suppress(NotFound, Forbidden):
-                    await message.delete()
+        if not (channel := guild.get_channel_or_thread(payload.channel_id)):
+            return
 
-                match config.phishing.action:
-                    case "ban":
-                        action = f"You have been banned from {message.guild.name}."
-                    case "kick":
-                        action = f"You have been kicked from {message.guild.name}."
-                    case "ignore":
-                        action = ""
-                    case _:
-                        logger.error(f"Invalid phishing action {config.phishing.action}.")
-                        return
-
-                dm_message = Template(config.phishing.dm).safe_substitute(
-                    user=str(message.author),
-                    action=action,
-                    LINK_PASSWORD=LINK_PASSWORD,
-                    LINK_2FA=LINK_2FA,
+        if not (author := guild.get_member(int(author_data["id"]))):
+            return
+
+        await self.take_action(channel.get_partial_message(payload.message_id), author, domain)
+
+    @require_permission(role_id="phishing.perms.role", permissions="phishing.perms.discord")
+    @slash_command()
+    async def phishing(self, inter: ACI) -> None:
+        """Manage the domains blocked or allowed in this server."""
+
+    async def _set_guild_domain(self, inter: ACI, domain: str, allowed: bool) -> None:
+        """Block or allow a domain in the guild, overriding the global list."""
+        domain = domain.strip().lower()
+
+        if not DOMAIN_REGEX.fullmatch(domain):
+            await inter.send(":x: Invalid domain.", ephemeral=True)
+            return
+
+        # A single statement, so concurrent commands can't insert the same domain twice
+        statement = insert(PhishingDomainModel).values(
+            guild_id=inter.guild.id, domain=domain, allowed=allowed
+        )
+        async with self.bot.Session() as session:
+            await session.execute(
+                statement.on_conflict_do_update(
+                    index_elements=["guild_id", "domain"],
+                    set_={"allowed": statement.excluded.allowed},
                 )
+            )
+            await session.commit()
+
+        self.matcher.set_domain(inter.guild.id, domain, not allowed)
+        await inter.send(
+            f":white_check_mark: `{domain}` is now {'allowed' if allowed else 'blocked'}."
+        )
+
+    @phishing.sub_command()
+    async def block(self, inter: ACI, domain: str) -> None:
+        """Block a domain in this server."""
+        await self._set_guild_domain(inter, domain, allowed=False)
+
+    @phishing.sub_command()
+    async def allow(self, inter: ACI, domain: str) -> None:
+        """Allow a domain in this server, even if it is in the global list."""
+        await self._set_guild_domain(inter, domain, allowed=True)
+
+    @phishing.sub_command()
+    async def remove(self, inter: ACI, domain: str) -> None:
+        """Remove a domain from the ones blocked or allowed in this server."""
+        domain = domain.strip().lower()
+
+        async with self.bot.Session() as session:
+            rowcount = (
+                await session.execute(
+                    delete(PhishingDomainModel).where(
+                        and_(
+                            PhishingDomainModel.guild_id == inter.guild.id,
+                            PhishingDomainModel.domain == domain,
+                        )
+                    )
+                )
+            ).rowcount
+            await session.commit()
 
-                with suppress(NotFound, Forbidden):
-                    await message.author.send(dm_message)
+        self.matcher.remove_domain(inter.guild.id, domain)
 
-                with suppress(Forbidden):
-                    if isinstance(message.author, Member):
-                        match config.phishing.action:
-                            case "ban":
-                                await message.author.ban(reason="Phishing link sent.")
-                            case "kick":
-                                await message.author.kick(reason="Phishing link sent.")
-                            case "ignore":
-                                pass
+        if rowcount == 0:
+            await inter.send(f":x: `{domain}` isn't blocked or allowed.", ephemeral=True)
+        else:
+            await inter.send(f":white_check_mark: `{domain}` removed.")
+
+    @phishing.sub_command(name="list")
+    async def list_(self, inter: ACI) -> None:
+        """List the domains blocked or allowed in this server."""
+        overlay = self.matcher.overlays.get(inter.guild.id)
+
+        if not overlay:
+            await inter.send(":x: No domains are blocked or allowed.", ephemeral=True)
+            return
 
-                break
+        config = await self.bot.get_config(inter)
+
+        paginator = PaginatorView(
+            inter=inter,
+            gen=[
+                f"{BLOCKED_EMOJI if blocked else ALLOWED_EMOJI} `{domain}`"
+                for domain, blocked in sorted(overlay.items())
+            ],
+            title="Server domains",
+            color=config.colors.info,
+            separator="\n",
+        )
+        await paginator.start()
+
+    @remove.autocomplete("domain")
+    async def autocomplete_guild_domain(self, inter: ACI, prefix: str) -> list[str]:
+        """Autocomplete the domains blocked or allowed in the guild."""
+        overlay = self.matcher.overlays.get(inter.guild.id, {})
+        return [domain for domain in sorted(overlay) if prefix in domain][:25]
 
 
 def setup(bot: StarBot) -> None:
@@ -0,0 +1,171 @@
+import logging
+import time
+from collections import defaultdict, deque
+from typing import NamedTuple, Optional
+
+from dateutil.relativedelta import relativedelta
+from disnake import HTTPException, Member, Message, Object
+from disnake.ext.commands import Cog
+
+from starbot.bot import StarBot
+from starbot.configuration.config import GuildConfig
+from starbot.exceptions import GuildNotConfiguredError
+from starbot.models.infraction import InfractionTypes
+from starbot.modules.filters._fingerprints import distance, fingerprint, normalize
+from starbot.modules.moderation.infract import Infract, InfractionError
+from starbot.utils.cache import LRUCache
+
+# Infraction applied by each configured action
+SPAM_ACTIONS = {
+    "warn": InfractionTypes.WARNING,
+    "mute": InfractionTypes.MUTE,
+    "kick": InfractionTypes.KICK,
+    "ban": InfractionTypes.BAN,
+}
+
+# Messages shorter than this, once normalized, are too common to be considered spam
+MIN_CONTENT_LENGTH = 8
+
+# Bound the memory used by the filter, whatever the configuration of each guild
+MAX_WINDOW = 600
+MAX_TRACKED_MEMBERS = 10_000
+MAX_MESSAGES_PER_MEMBER = 50
+
+logger = logging.getLogger(__name__)
+
+
+class _SentMessage(NamedTuple):
+    """A message recently sent by a member."""
+
+    sent_at: float
+    hash: int
+    simhash: int
+    channel_id: int
+    message_id: int
+
+
+class Spam(Cog):
+    """Detect members repeating the same message, even across channels."""
+
+    def __init__(self, bot: StarBot) -> None:
+        self.bot = bot
+        # (guild ID, user ID) mapped to the messages the member sent within the window
+        self.history: LRUCache[tuple[int, int], deque[_SentMessage]] = LRUCache(
+            MAX_TRACKED_MEMBERS, MAX_WINDOW
+        )
+
+    def record(
+        self, message: Message, content: str, window: int, max_distance: int
+    ) -> list[_SentMessage]:
+        """
+        Record the message, returning the recent messages it repeats, itself included.
+
+        Messages are repeated if their normalized contents are identical,
+        or if their simhashes differ by at most `max_distance` bits.
+        """
+        key = (message.guild.id, message.author.id)
+        now = time.monotonic()
+
+        content_hash, content_simhash = fingerprint(content)
+        sent = _SentMessage(now, content_hash, content_simhash, message.channel.id, message.id)
+
+        if (history := self.history.get(key)) is None:
+            history = deque(maxlen=MAX_MESSAGES_PER_MEMBER)
+
+        while history and now - history[0].sent_at > window:
+            history.popleft()
+
+        history.append(sent)
+        # Refresh the expiry, the history is only needed as long as the member keeps talking
+        self.history.set(key, history)
+
+        return [
+            other
+            for other in history
+            if other.hash == content_hash
+            or distance(other.simhash, content_simhash) <= max_distance
+        ]
+
+    @Cog.listener()
+    async def on_message(self, message: Message) -> None:
+        """Find members repeating the same message."""
+        if message.guild is None or message.author.bot or not isinstance(message.author, Member):
+            return
+
+        if len(content := normalize(message.content)) < MIN_CONTENT_LENGTH:
+            return
+
+        try:
+            config = await self.bot.get_config(guild_id=message.guild.id)
+        except GuildNotConfiguredError:
+            return
+
+        if not config.spam.enabled:
+            return
+
+        if message.channel.permissions_for(message.author).is_superset(
+            config.spam.bypass_permission
+        ):
+            return
+
+        window = max(1, min(config.spam.window, MAX_WINDOW))
+        repeated = self.record(message, content, window, config.spam.similarity_distance)
+
+        if len(repeated) < config.spam.duplicate_threshold:
+            return
+
+        # Start over, so the next messages don't trigger the filter again right away
+        self.history.pop((message.guild.id, message.author.id))
+
+        logger.debug(f"Detected {len(repeated)} repeated messages from {message.author}.")
+        await self.delete_messages(message, repeated)
+        await self.take_action(message.author, config, len(repeated), window)
+
+    async def delete_messages(self, message: Message, repeated: list[_SentMessage]) -> None:
+        """Bulk delete the repeated messages, in each channel they were sent to."""
+        channels: defaultdict[int, list[Object]] = defaultdict(list)
+        for sent in repeated:
+            channels[sent.channel_id].append(Object(sent.message_id))
+
+        for channel_id, messages in channels.items():
+            if not (channel := message.guild.get_channel_or_thread(channel_id)):
+                continue
+
+            try:
+                await channel.delete_messages(messages)
+            except HTTPException as e:
+                logger.debug(f"Failed to delete spam messages in {channel}: {e}")
+
+    async def take_action(
+        self, member: Member, config: GuildConfig, count: int, window: int
+    ) -> None:
+        """Apply the configured infraction to the member."""
+        if (type_ := SPAM_ACTIONS.get(config.spam.action)) is None:
+            return
+
+        infract_module: Optional[Infract] = self.bot.get_cog("Infract")
+        if not infract_module:
+            return
+
+        duration = (
+            relativedelta(minutes=config.spam.mute_duration)
+            if type_ == InfractionTypes.MUTE
+            else None
+        )
+
+        try:
+            await infract_module.apply_infraction(
+                member.guild,
+                type_,
+                member,
+                member.guild.me,
+                f"Sent {count} repeated messages within {window} seconds.",
+                duration,
+            )
+        except InfractionError as e:
+            logger.debug(f"Couldn't apply the spam infraction to {member}: {e}")
+
+
+def setup(bot: StarBot) -> None:
+    """Loads the Spam cog."""
+    bot.add_cog(Spam(bot))
@@ -1,18 +1,25 @@
 import logging
 from collections import deque
 from io import StringIO
+from typing import Optional
 
 import arrow
-from disnake import File
+from disnake import File, User
 from disnake.ext.commands import Cog, slash_command
 
 from starbot.bot import StarBot
 from starbot.constants import ACI
+from starbot.modules.moderation.infract import INFRACTION_LOCKS
 from starbot.utils.time import discord_timestamp
 
 # The number of lines that will be held by the buffer
 BUFFER_SIZE = 100
 
+# Number of days of events that can be exported at once
+MAX_EXPORT_DAYS = 30
+# Upload limit outside of servers
+DEFAULT_FILESIZE_LIMIT = 8 * 1024 * 1024
+
 FORMAT_STRING = "%(asctime)s %(name)s %(levelname)s %(message)s"
 
 
@@ -69,6 +76,55 @@ class Log(Cog):
             file=File(content, "logs.txt"),
         )
 
+    @slash_command()
+    async def events(
+        self, inter: ACI, event: Optional[str] = None, user: Optional[User] = None, days: int = 1
+    ) -> None:
+        """Upload the logged events of this server, optionally filtered, as a JSONL attachment."""
+        logging_cog = self.bot.get_cog("Logging")
+
+        if not logging_cog or not logging_cog.events:
+            await inter.send(":x: The event sink is disabled.", ephemeral=True)
+            return
+
+        await inter.response.defer()
+
+        days = max(1, min(days, MAX_EXPORT_DAYS))
+        file, count, truncated = await logging_cog.events.export(
+            days,
+            inter.guild.filesize_limit if inter.guild else DEFAULT_FILESIZE_LIMIT,
+            guild_id=inter.guild_id,
+            event=event,
+            user_id=user.id if user else None,
+        )
+
+        message = f"{count} events of the last {days} day(s) uploaded as an attachment"
+        if truncated:
+            message += " (truncated, narrow down the filters to get the rest)"
+
+        await inter.send(message, file=File(file, "events.jsonl.gz"))
+
+    @slash_command()
+    async def metrics(self, inter: ACI) -> None:
+        """Show the internal metrics of the logging pipeline."""
+        lines = []
+
+        if logging_cog := self.bot.get_cog("Logging"):
+            lines.append("**Log sender**")
+            lines.extend(f"{name}: {value}" for name, value in logging_cog.sender.metrics().items())
+
+            suppressed = logging_cog.suppressions.suppressed
+            lines.append(f"**Suppressed events** ({sum(suppressed.values())} in total)")
+            lines.extend(f"{event}: {count}" for event, count in suppressed.most_common(10))
+
+        lines.append("**Infraction locks**")
+        lines.extend(
+            f"{name}: {value:.3f}" if isinstance(value, float) else f"{name}: {value}"
+            for name, value in INFRACTION_LOCKS.metrics().items()
+        )
+
+        await inter.send("\n".join(lines) or ":x: No metrics available.", ephemeral=True)
+
 
 def setup(bot: StarBot) -> None:
     """Load the Info cog."""
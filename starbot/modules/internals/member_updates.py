@@ -0,0 +1,77 @@
+from disnake import Member, Role
+from disnake.ext.commands import Cog
+
+from starbot.bot import StarBot
+from starbot.configuration.config import GuildConfig
+from starbot.exceptions import GuildNotConfiguredError
+
+
+class MemberUpdate:
+    """The changes of a single member update, along with the guild configuration."""
+
+    __slots__ = ("before", "after", "config", "nick_changed", "verified", "added", "removed")
+
+    def __init__(
+        self,
+        before: Member,
+        after: Member,
+        config: GuildConfig,
+        nick_changed: bool,
+        verified: bool,
+        added: set[Role],
+        removed: set[Role],
+    ) -> None:
+        self.before = before
+        self.after = after
+        self.config = config
+        self.nick_changed = nick_changed
+        self.verified = verified
+        self.added = added
+        self.removed = removed
+
+
+class MemberUpdates(Cog):
+    """
+    Compute the changes of each member update once, and dispatch them to the other modules.
+
+    The following events are dispatched with a `MemberUpdate`, only when relevant:
+    - member_nick_update
+    - member_verified
+    - member_roles_update
+    """
+
+    def __init__(self, bot: StarBot) -> None:
+        self.bot = bot
+
+    @Cog.listener()
+    async def on_member_update(self, before: Member, after: Member) -> None:
+        """Diff the member and dispatch the changes."""
+        nick_changed = before.nick != after.nick
+        verified = before.pending is True and after.pending is False
+
+        before_roles = set(before.roles)
+        after_roles = set(after.roles)
+        added = after_roles - before_roles
+        removed = before_roles - after_roles
+
+        if not (nick_changed or verified or added or removed):
+            return
+
+        try:
+            config = await self.bot.get_config(guild_id=after.guild.id)
+        except GuildNotConfiguredError:
+            return
+
+        update = MemberUpdate(before, after, config, nick_changed, verified, added, removed)
+
+        if nick_changed:
+            self.bot.dispatch("member_nick_update", update)
+        if verified:
+            self.bot.dispatch("member_verified", update)
+        if added or removed:
+            self.bot.dispatch("member_roles_update", update)
+
+
+def setup(bot: StarBot) -> None:
+    """Load the module."""
+    bot.add_cog(MemberUpdates(bot))
@@ -0,0 +1,89 @@
+import asyncio
+from typing import NamedTuple, Optional
+
+from disnake import AuditLogAction, AuditLogEntry, Guild, Member, Object, User
+
+from starbot.utils.cache import LRUCache
+
+# Audit log entries are created right before or after the matching gateway event
+ENTRY_TTL = 30
+MAX_ENTRIES = 5000
+# Maximum time to wait for an entry before logging an event without its actor
+ACTOR_DEADLINE = 2
+
+Actor = User | Member | Object
+_Key = tuple[int, AuditLogAction, Optional[int]]
+
+
+class ActorLookup(NamedTuple):
+    """The audit log actions to find the actor of, deferred until it is needed."""
+
+    actions: AuditLogAction | tuple[AuditLogAction, ...]
+    target_id: Optional[int]
+
+
+class AuditLogIndex:
+    """
+    Index the recent audit log entries of every guild, to find who performed an action.
+
+    Entries come from the audit log gateway events, so no API call is needed. They are
+    keyed by guild, action and target, and kept for `ttl` seconds.
+    """
+
+    def __init__(self, ttl: float = ENTRY_TTL, maxsize: int = MAX_ENTRIES) -> None:
+        self.entries: LRUCache[_Key, Actor] = LRUCache(maxsize, ttl)
+        self.waiters: dict[_Key, list[asyncio.Future]] = {}
+
+    def add(self, entry: AuditLogEntry) -> None:
+        """Index a new entry, waking up anyone waiting for it."""
+        if entry.user is None:
+            return
+
+        key = (entry.guild.id, entry.action, getattr(entry.target, "id", None))
+        self.entries.set(key, entry.user)
+
+        for future in self.waiters.pop(key, ()):
+            if not future.done():
+                future.set_result(entry.user)
+
+    async def find_actor(
+        self,
+        guild: Guild,
+        actions: AuditLogAction | tuple[AuditLogAction, ...],
+        target_id: Optional[int],
+        timeout: float = ACTOR_DEADLINE,
+    ) -> Optional[Actor]:
+        """
+        Return who performed one of the actions on the target.
+
+        If the entry wasn't received yet, wait for it up to `timeout` seconds.
+        Returns None right away if the bot cannot see the audit log.
+        """
+        if not guild.me.guild_permissions.view_audit_log:
+            return None
+
+        if isinstance(actions, AuditLogAction):
+            actions = (actions,)
+
+        keys = [(guild.id, action, target_id) for action in actions]
+
+        for key in keys:
+            if actor := self.entries.get(key):
+                return actor
+
+        future = asyncio.get_running_loop().create_future()
+
+        for key in keys:
+            self.waiters.setdefault(key, []).append(future)
+
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            for key in keys:
+                if (waiters := self.waiters.get(key)) and future in waiters:
+                    waiters.remove(future)
+
+                    if not waiters:
+                        del self.waiters[key]
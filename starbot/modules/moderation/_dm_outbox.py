@@ -0,0 +1,121 @@
+import asyncio
+import logging
+from typing import NamedTuple, Optional
+
+from disnake import HTTPException, Member, User
+from sqlalchemy import update
+
+from starbot.bot import StarBot
+from starbot.models.infraction import InfractionModel
+from starbot.utils.retry import MAX_RETRIES, retry_http
+
+# Number of DMs being delivered at once
+WORKERS = 2
+
+# DMs sent before a kick or a ban hold the command, so they get a shorter deadline
+IMMEDIATE_RETRIES = 1
+IMMEDIATE_TIMEOUT = 5
+
+logger = logging.getLogger(__name__)
+
+
+class _DM(NamedTuple):
+    user: User | Member
+    content: str
+    infraction: Optional[InfractionModel]
+
+
+class DMOutbox:
+    """
+    Deliver the infraction DMs in the background, retrying on rate limits and server errors.
+
+    Once known, the outcome of the delivery is stored in the `dm_sent` column of the infraction.
+    DMs which must arrive before an action, such as a ban, are delivered right away instead.
+    """
+
+    def __init__(self, bot: StarBot, workers: int = WORKERS) -> None:
+        self.bot = bot
+        self.worker_count = workers
+
+        self.queue: asyncio.Queue[_DM] = asyncio.Queue()
+        self.workers: list[asyncio.Task] = []
+
+        # Delivery metrics
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    def send(
+        self, user: User | Member, content: str, infraction: Optional[InfractionModel] = None
+    ) -> None:
+        """Queue a DM, recording its delivery on the infraction if provided."""
+        self.queue.put_nowait(_DM(user, content, infraction))
+
+        if not self.workers:
+            self.workers = [asyncio.create_task(self._work()) for _ in range(self.worker_count)]
+
+    async def send_now(self, user: User | Member, content: str) -> bool:
+        """
+        Deliver a DM before returning, skipping the queue.
+
+        Used when the user must receive the DM while still sharing a guild with the bot.
+        Returns whether the DM was delivered within the deadline.
+        """
+        try:
+            return await asyncio.wait_for(
+                self.deliver(user, content, IMMEDIATE_RETRIES), IMMEDIATE_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            self.failed += 1
+            return False
+
+    async def deliver(self, user: User | Member, content: str, retries: int = MAX_RETRIES) -> bool:
+        """Send the DM, returning whether it was delivered."""
+        try:
+            # Closed DMs and other client errors won't be fixed by retrying
+            await retry_http(lambda: user.send(content), retries, self._count_retry)
+        except HTTPException as e:
+            logger.debug(f"Couldn't send a DM to {user.id}: {e}")
+            self.failed += 1
+            return False
+
+        self.sent += 1
+        return True
+
+    def _count_retry(self) -> None:
+        self.retried += 1
+
+    async def _work(self) -> None:
+        while True:
+            dm = await self.queue.get()
+
+            try:
+                await self._process(dm)
+            except Exception:
+                logger.exception(f"Error while delivering a DM to {dm.user.id}")
+            finally:
+                self.queue.task_done()
+
+    async def _process(self, dm: _DM, retries: int = MAX_RETRIES) -> None:
+        delivered = await self.deliver(dm.user, dm.content, retries)
+
+        if dm.infraction is not None:
+            async with self.bot.Session() as session:
+                await session.execute(
+                    update(InfractionModel)
+                    .where(InfractionModel.id == dm.infraction.id)
+                    .values(dm_sent=delivered)
+                )
+                await session.commit()
+
+            # Keep the cached copy of the infraction up to date
+            dm.infraction.dm_sent = delivered
+
+    async def close(self) -> None:
+        """Stop the workers and deliver the queued DMs without retrying."""
+        for worker in self.workers:
+            worker.cancel()
+        self.workers = []
+
+        while not self.queue.empty():
+            await self._process(self.queue.get_nowait(), retries=0)
@@ -0,0 +1,89 @@
+import csv
+import gzip
+import json
+from io import BytesIO
+from typing import Any, Literal, Optional
+
+from starbot.constants import COMPRESSION_MARGIN
+from starbot.models.infraction import InfractionModel
+from starbot.modules.moderation._constants import INFRACTION_NAME
+
+ExportFormat = Literal["csv", "jsonl"]
+
+EXPORT_FIELDS = (
+    "id",
+    "user_id",
+    "moderator_id",
+    "type",
+    "reason",
+    "created_at",
+    "duration",
+    "cancelled",
+    "dm_sent",
+)
+
+
+def infraction_to_row(infraction: InfractionModel) -> dict[str, Any]:
+    """Convert an infraction into a flat row."""
+    return {
+        "id": infraction.id,
+        "user_id": infraction.user_id,
+        "moderator_id": infraction.moderator_id,
+        "type": INFRACTION_NAME[infraction.type],
+        "reason": infraction.reason,
+        "created_at": infraction.created_at.isoformat(),
+        "duration": infraction.duration.total_seconds() if infraction.duration else None,
+        "cancelled": infraction.cancelled,
+        "dm_sent": infraction.dm_sent,
+    }
+
+
+class ExportWriter:
+    """
+    Write rows into gzip compressed files, split in parts of at most `max_size` bytes.
+
+    Only the part being written is held in memory, whatever the total number of rows.
+    CSV parts each start with their own header, so they can be read independently.
+    """
+
+    def __init__(self, format_: ExportFormat, max_size: int) -> None:
+        self.format = format_
+        self.max_size = max_size - COMPRESSION_MARGIN
+
+        self.rows = 0
+        self.parts = 0
+        self._open()
+
+    def _open(self) -> None:
+        self.buffer = BytesIO()
+        self.file = gzip.open(self.buffer, "wt", encoding="utf-8", newline="")
+        self.part_rows = 0
+
+        if self.format == "csv":
+            self.writer = csv.DictWriter(self.file, EXPORT_FIELDS)
+            self.writer.writeheader()
+
+    def write(self, row: dict[str, Any]) -> Optional[BytesIO]:
+        """Write a row, returning the previous part if it was full."""
+        full_part = None
+
+        if self.part_rows and self.buffer.tell() >= self.max_size:
+            full_part = self.finish()
+            self._open()
+
+        if self.format == "csv":
+            self.writer.writerow(row)
+        else:
+            self.file.write(json.dumps(row) + "\n")
+
+        self.rows += 1
+        self.part_rows += 1
+        return full_part
+
+    def finish(self) -> BytesIO:
+        """Close the current part and return it."""
+        self.file.close()
+        self.parts += 1
+
+        self.buffer.seek(0)
+        return self.buffer
@@ -0,0 +1,130 @@
+from collections import Counter, deque
+from typing import Optional
+
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from starbot.bot import StarBot
+from starbot.models.infraction import InfractionModel, InfractionTypes
+from starbot.modules.moderation._constants import UNIQUE_INFRACTIONS
+from starbot.utils.cache import LRUCache
+
+# Number of most recent infractions kept for each user
+LATEST_INFRACTIONS = 50
+
+MAX_SUMMARIES = 10_000
+# Infractions may be changed by another process, so summaries are eventually reloaded
+SUMMARY_TTL = 10 * 60
+
+
+class InfractionSummary:
+    """The infractions of a single user in a guild."""
+
+    __slots__ = ("counts", "active", "latest")
+
+    def __init__(self) -> None:
+        self.counts: Counter[InfractionTypes] = Counter()
+        self.active: dict[InfractionTypes, InfractionModel] = {}
+        self.latest: deque[InfractionModel] = deque(maxlen=LATEST_INFRACTIONS)
+
+    @property
+    def complete(self) -> bool:
+        """Whether every infraction of the user is part of `latest`."""
+        return sum(self.counts.values()) == len(self.latest)
+
+    def add(self, infraction: InfractionModel) -> None:
+        """Add a new infraction, which must be the most recent one."""
+        self.counts[infraction.type] += 1
+        self.latest.append(infraction)
+
+        if infraction.type in UNIQUE_INFRACTIONS and infraction.active:
+            self.active[infraction.type] = infraction
+
+    def get_active(self, type_: InfractionTypes) -> Optional[InfractionModel]:
+        """Return the active infraction of that type, forgetting it if it expired."""
+        if (infraction := self.active.get(type_)) and not infraction.active:
+            del self.active[type_]
+            return None
+        return infraction
+
+
+class InfractionSummaries:
+    """
+    Cache the infraction summary of each user, keyed by guild and user.
+
+    Summaries are loaded from the database on the first lookup, then kept up to date
+    by the commands changing infractions.
+    """
+
+    def __init__(self, bot: StarBot) -> None:
+        self.bot = bot
+        self.cache: LRUCache[tuple[int, int], InfractionSummary] = LRUCache(
+            MAX_SUMMARIES, SUMMARY_TTL
+        )
+        # Bumped on every change, so loads racing with a change are discarded
+        self.generations: LRUCache[tuple[int, int], int] = LRUCache(MAX_SUMMARIES, SUMMARY_TTL)
+
+    async def get(
+        self,
+        guild_id: int,
+        user_id: int,
+        refresh: bool = False,
+        session: Optional[AsyncSession] = None,
+    ) -> InfractionSummary:
+        """
+        Return the summary of that user, loading it if needed.
+
+        With `refresh`, the summary is always reloaded, to see the changes of other processes.
+        It is loaded through `session` if provided, rather than a new session.
+        """
+        key = (guild_id, user_id)
+
+        if not refresh and (summary := self.cache.get(key)):
+            return summary
+
+        while True:
+            generation = self.generations.get(key, 0)
+
+            if session is None:
+                async with self.bot.Session() as new_session:
+                    summary = await self._load(new_session, guild_id, user_id)
+            else:
+                summary = await self._load(session, guild_id, user_id)
+
+            # The summary changed during the load, which may have missed the change
+            if self.generations.get(key, 0) == generation:
+                break
+
+        self.cache.set(key, summary)
+        return summary
+
+    @staticmethod
+    async def _load(session: AsyncSession, guild_id: int, user_id: int) -> InfractionSummary:
+        summary = InfractionSummary()
+
+        infractions = await session.stream(
+            select(InfractionModel)
+            .where(and_(InfractionModel.guild_id == guild_id, InfractionModel.user_id == user_id))
+            .order_by(InfractionModel.id)
+        )
+
+        async for infraction in infractions:
+            summary.add(infraction[0])
+
+        return summary
+
+    def add(self, infraction: InfractionModel) -> None:
+        """Record a new infraction in the summary of its user, if cached."""
+        key = (infraction.guild_id, infraction.user_id)
+        self._bump(key)
+
+        if summary := self.cache.get(key):
+            summary.add(infraction)
+
+    def invalidate(self, guild_id: int, user_id: int) -> None:
+        """Forget the summary of that user, to be reloaded on the next lookup."""
+        self._bump((guild_id, user_id))
+        self.cache.pop((guild_id, user_id))
+
+    def _bump(self, key: tuple[int, int]) -> None:
+        self.generations.set(key, self.generations.get(key, 0) + 1)
@@ -0,0 +1,224 @@
+import asyncio
+import enum
+import logging
+import time
+from collections import deque
+from typing import Optional
+
+from disnake import Embed, File, HTTPException, TextChannel, Thread
+
+from starbot.utils.retry import MAX_RETRIES, retry_http
+
+# Limits of a single Discord message
+MAX_EMBEDS = 10
+MAX_EMBEDS_LENGTH = 6000
+
+# Maximum number of embeds waiting for a single channel, moderation logs excluded
+MAX_QUEUE_DEPTH = 500
+
+# Drops are reported at most once per that many seconds
+DROP_WARNING_INTERVAL = 60
+
+logger = logging.getLogger(__name__)
+
+
+class LogPriority(enum.IntEnum):
+    """Priority of a log message, lower values being sent first."""
+
+    HIGH = 0  # Moderation actions, never dropped
+    NORMAL = 1
+    LOW = 2  # Message edits and deletions
+
+
+class _ChannelQueue:
+    """Embeds waiting to be sent to a single channel, one deque per priority."""
+
+    __slots__ = ("channel", "entries", "task")
+
+    def __init__(self, channel: TextChannel | Thread) -> None:
+        self.channel = channel
+        self.entries = tuple(deque() for _ in LogPriority)
+        self.task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self.entries)
+
+    def pop_batch(self) -> tuple[list[Embed], Optional[File]]:
+        """
+        Pop the most important embeds that fit in a single message.
+
+        An embed with an attached file is always sent on its own.
+        """
+        batch = []
+        length = 0
+
+        for entries in self.entries:
+            while entries and len(batch) < MAX_EMBEDS:
+                embed, file = entries[0]
+
+                if file:
+                    if batch:
+                        return batch, None
+
+                    entries.popleft()
+                    return [embed], file
+
+                if batch and length + len(embed) > MAX_EMBEDS_LENGTH:
+                    return batch, None
+
+                entries.popleft()
+                batch.append(embed)
+                length += len(embed)
+
+        return batch, None
+
+
+class LogSender:
+    """
+    Deliver the log embeds in the background, through one priority queue per channel.
+
+    Embeds are buffered for `delay` seconds after the first one is queued, then sent in as few
+    messages as possible, up to 10 embeds per message, the most important ones first.
+    Embeds with an attached file are sent in their own message.
+    Each queue is bounded: once full, the oldest of the least important embeds is dropped.
+    """
+
+    def __init__(self, delay: float, max_depth: int = MAX_QUEUE_DEPTH) -> None:
+        self.delay = delay
+        self.max_depth = max_depth
+        self.queues: dict[int, _ChannelQueue] = {}
+
+        # Backpressure metrics
+        self.queued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.retried = 0
+        self.failed = 0
+
+        self._unreported_drops = 0
+        self._last_drop_warning = float("-inf")
+
+    @property
+    def depth(self) -> int:
+        """Number of embeds waiting to be sent, across all channels."""
+        return sum(len(queue) for queue in self.queues.values())
+
+    def send(
+        self,
+        channel: TextChannel | Thread,
+        embed: Embed,
+        priority: LogPriority = LogPriority.NORMAL,
+        file: Optional[File] = None,
+    ) -> None:
+        """Queue an embed, and optionally a file, to be sent to that channel."""
+        if not (queue := self.queues.get(channel.id)):
+            queue = self.queues[channel.id] = _ChannelQueue(channel)
+
+        if not self._make_room(queue, priority):
+            return
+
+        queue.entries[priority].append((embed, file))
+        self.queued += 1
+
+        if queue.task is None:
+            queue.task = asyncio.create_task(self._drain(queue))
+
+    def _make_room(self, queue: _ChannelQueue, priority: LogPriority) -> bool:
+        """
+        Drop the oldest of the least important embeds if the queue is full.
+
+        Returns False if the new embed is the one that should be dropped.
+        """
+        if priority == LogPriority.HIGH or len(queue) < self.max_depth:
+            return True
+
+        self.dropped += 1
+        self._report_drop(queue)
+
+        for level in (LogPriority.LOW, LogPriority.NORMAL):
+            # The remaining embeds are all more important than the new one
+            if level < priority:
+                break
+
+            if queue.entries[level]:
+                queue.entries[level].popleft()
+                return True
+
+        return False
+
+    def _report_drop(self, queue: _ChannelQueue) -> None:
+        """Warn about the dropped embeds, at most once per `DROP_WARNING_INTERVAL` seconds."""
+        self._unreported_drops += 1
+        now = time.monotonic()
+
+        if now - self._last_drop_warning >= DROP_WARNING_INTERVAL:
+            logger.warning(
+                f"Log queues are full, dropped {self._unreported_drops} embeds "
+                f"(latest in channel {queue.channel.id}, {self.dropped} in total)."
+            )
+            self._unreported_drops = 0
+            self._last_drop_warning = now
+
+    def metrics(self) -> dict[str, int]:
+        """Return the delivery metrics, including the number of embeds currently queued."""
+        return {
+            "queued": self.queued,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "retried": self.retried,
+            "failed": self.failed,
+            "depth": self.depth,
+        }
+
+    async def _drain(self, queue: _ChannelQueue) -> None:
+        """Send the content of the queue once the delay expired, until it is empty."""
+        try:
+            await asyncio.sleep(self.delay)
+
+            while len(queue):
+                await self._deliver(queue.channel, *queue.pop_batch())
+        finally:
+            queue.task = None
+
+            if not len(queue):
+                self.queues.pop(queue.channel.id, None)
+
+    async def _deliver(
+        self,
+        channel: TextChannel | Thread,
+        embeds: list[Embed],
+        file: Optional[File] = None,
+        retries: int = MAX_RETRIES,
+    ) -> None:
+        """Send the embeds, retrying on rate limits and server errors."""
+
+        async def send() -> None:
+            if file:
+                # Rewind the file, in case a previous attempt read it
+                file.reset()
+                await channel.send(embeds=embeds, file=file)
+            else:
+                await channel.send(embeds=embeds)
+
+        try:
+            await retry_http(send, retries, self._count_retry)
+        except HTTPException as e:
+            logger.debug(f"Couldn't send logging message: {e}")
+            self.failed += len(embeds)
+            return
+
+        self.sent += len(embeds)
+
+    def _count_retry(self) -> None:
+        self.retried += 1
+
+    async def close(self) -> None:
+        """Stop the background delivery and send everything still queued."""
+        for queue in list(self.queues.values()):
+            if queue.task is not None:
+                queue.task.cancel()
+
+            while len(queue):
+                await self._deliver(queue.channel, *queue.pop_batch(), retries=0)
+
+        self.queues.clear()
@@ -0,0 +1,60 @@
+from datetime import datetime
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from starbot.models.infraction import InfractionTypes
+from starbot.models.infraction_rollup import InfractionRollupModel, InfractionUserRollupModel
+
+
+async def record_infractions(
+    session: AsyncSession,
+    guild_id: int,
+    type_: InfractionTypes,
+    moderator_id: int,
+    created_at: datetime,
+    user_ids: list[int],
+) -> None:
+    """
+    Count new infractions in the rollups.
+
+    This should run in the same transaction as the creation of the infractions,
+    so the rollups never drift from the infraction table.
+    """
+    daily = insert(InfractionRollupModel).values(
+        guild_id=guild_id,
+        day=created_at.date(),
+        type=type_,
+        moderator_id=moderator_id,
+        count=len(user_ids),
+    )
+    await session.execute(
+        daily.on_conflict_do_update(
+            index_elements=["guild_id", "day", "type", "moderator_id"],
+            set_={"count": InfractionRollupModel.count + daily.excluded.count},
+        )
+    )
+
+    per_user = insert(InfractionUserRollupModel)
+    await session.execute(
+        per_user.on_conflict_do_update(
+            index_elements=["guild_id", "user_id", "type"],
+            set_={
+                "count": InfractionUserRollupModel.count + per_user.excluded.count,
+                "last_at": func.greatest(
+                    InfractionUserRollupModel.last_at, per_user.excluded.last_at
+                ),
+            },
+        ),
+        [
+            {
+                "guild_id": guild_id,
+                "user_id": user_id,
+                "type": type_,
+                "count": 1,
+                "last_at": created_at,
+            }
+            for user_id in user_ids
+        ],
+    )
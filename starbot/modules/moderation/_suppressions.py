@@ -0,0 +1,35 @@
+from collections import Counter
+from typing import Hashable, Optional
+
+from starbot.utils.cache import LRUCache
+
+# Seconds during which an ignored event stays suppressed
+SUPPRESSION_TTL = 60
+# Enough for mass bans and kicks, while keeping the memory bounded
+MAX_SUPPRESSIONS = 10_000
+
+
+class EventSuppressor:
+    """
+    Keep track of the events that shouldn't be logged.
+
+    Events are keyed by guild, event name and subject, usually the user the event is about.
+    Entries expire after `ttl` seconds and the oldest are evicted past `maxsize` entries.
+    """
+
+    def __init__(self, ttl: float = SUPPRESSION_TTL, maxsize: int = MAX_SUPPRESSIONS) -> None:
+        self.entries: LRUCache[tuple[int, str, Hashable], bool] = LRUCache(maxsize, ttl)
+        self.suppressed: Counter[str] = Counter()
+
+    def ignore(
+        self, guild_id: int, event: str, subject_id: Hashable, ttl: Optional[float] = None
+    ) -> None:
+        """Suppress that event until it expires."""
+        self.entries.set((guild_id, event, subject_id), True, ttl)
+
+    def is_suppressed(self, guild_id: int, event: str, subject_id: Hashable) -> bool:
+        """Return whether the event is suppressed, counting it if so."""
+        if (guild_id, event, subject_id) in self.entries:
+            self.suppressed[event] += 1
+            return True
+        return False
@@ -0,0 +1,57 @@
+from io import BytesIO
+from typing import Iterable, NamedTuple
+
+from disnake.utils import snowflake_time
+
+# Maximum size of a transcript, in bytes, before being truncated
+MAX_TRANSCRIPT_SIZE = 1024 * 1024
+
+TRUNCATION_NOTICE = "\n[{count} more messages truncated]\n"
+
+
+class TranscriptLine(NamedTuple):
+    """A single message of a transcript, None fields being unknown."""
+
+    message_id: int
+    author: str | None
+    content: str | None
+    attachments: int = 0
+
+
+def build_transcript(
+    lines: Iterable[TranscriptLine], max_size: int = MAX_TRANSCRIPT_SIZE
+) -> BytesIO:
+    """
+    Write the messages, sorted chronologically, into an in-memory text file.
+
+    The transcript is truncated, with a notice, once it would exceed `max_size` bytes.
+    """
+    buffer = BytesIO()
+    lines = sorted(lines)
+    # Keep room for the notice, so the transcript never exceeds the limit
+    limit = max_size - len(TRUNCATION_NOTICE.format(count=len(lines)).encode())
+
+    for index, line in enumerate(lines):
+        timestamp = snowflake_time(line.message_id).strftime("%Y-%m-%d %H:%M:%S")
+
+        if line.content is None:
+            content = "(content unavailable)"
+        else:
+            # Indent continuation lines so each message stays visually separated
+            content = line.content.replace("\n", "\n    ")
+
+        if line.attachments:
+            content += f" [{line.attachments} attachment(s)]"
+
+        entry = (
+            f"[{timestamp}] {line.author or 'Unknown user'} ({line.message_id}): {content}\n"
+        ).encode()
+
+        if buffer.tell() + len(entry) > limit:
+            buffer.write(TRUNCATION_NOTICE.format(count=len(lines) - index).encode())
+            break
+
+        buffer.write(entry)
+
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,152 @@
+import logging
+import time
+from collections import deque
+from contextlib import suppress
+from datetime import datetime, timedelta, timezone
+
+from disnake import Guild, HTTPException, Member, Object
+from disnake.ext.commands import Cog
+
+from starbot.bot import StarBot
+from starbot.configuration.config import GuildConfig
+from starbot.exceptions import GuildNotConfiguredError
+from starbot.modules.moderation._log_sender import LogPriority
+from starbot.utils.sliding_window import SlidingWindowCounter
+
+# Upper bounds of the account age buckets, each counting the joins of accounts younger than it
+AGE_BUCKETS = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+    "month": timedelta(days=30),
+}
+
+# Bound the memory used by each guild, whatever its configuration
+MAX_WINDOW = 300
+MAX_RECENT_JOINS = 200
+# Number of members mentioned by the alert, to fit in an embed field
+MAX_MENTIONED_RAIDERS = 40
+
+logger = logging.getLogger(__name__)
+
+
+class _GuildJoins:
+    """The join counters of a single guild."""
+
+    __slots__ = ("window", "joins", "ages", "recent", "raid_until")
+
+    def __init__(self, window: int) -> None:
+        self.window = window
+        self.joins = SlidingWindowCounter(window)
+        self.ages = {bucket: SlidingWindowCounter(window) for bucket in AGE_BUCKETS}
+        self.recent: deque[tuple[int, Member]] = deque(maxlen=MAX_RECENT_JOINS)
+        self.raid_until = 0.0
+
+
+class AntiRaid(Cog):
+    """Detect floods of new members, and react to them."""
+
+    def __init__(self, bot: StarBot) -> None:
+        self.bot = bot
+        self.guilds: dict[int, _GuildJoins] = {}
+
+    def is_raid_active(self, guild_id: int) -> bool:
+        """Whether the guild is currently being raided."""
+        return (state := self.guilds.get(guild_id)) is not None and (
+            time.monotonic() < state.raid_until
+        )
+
+    @Cog.listener("on_member_join")
+    async def count_join(self, member: Member) -> None:
+        """Count the new member, and start a raid if a threshold is crossed."""
+        try:
+            config = await self.bot.get_config(guild_id=member.guild.id)
+        except GuildNotConfiguredError:
+            return
+
+        if not config.anti_raid.enabled:
+            return
+
+        window = max(1, min(config.anti_raid.window, MAX_WINDOW))
+        if (state := self.guilds.get(member.guild.id)) is None or state.window != window:
+            state = self.guilds[member.guild.id] = _GuildJoins(window)
+
+        now = int(time.monotonic())
+        joins = state.joins.add(now=now)
+        account_age = datetime.now(timezone.utc) - member.created_at
+
+        for bucket, max_age in AGE_BUCKETS.items():
+            if account_age < max_age:
+                state.ages[bucket].add(now=now)
+
+        state.recent.append((now, member))
+        new_accounts = state.ages[config.anti_raid.new_account_age].count(now)
+
+        was_active = self.is_raid_active(member.guild.id)
+
+        if (
+            joins >= config.anti_raid.join_threshold
+            or new_accounts >= config.anti_raid.new_account_threshold
+        ):
+            state.raid_until = time.monotonic() + config.anti_raid.cooldown
+
+            if not was_active:
+                await self.start_raid(member.guild, config, state, now)
+                return
+
+        if self.is_raid_active(member.guild.id):
+            await self.quarantine(member, config)
+
+    async def start_raid(
+        self, guild: Guild, config: GuildConfig, state: _GuildJoins, now: int
+    ) -> None:
+        """Alert the moderators and quarantine the members who joined within the window."""
+        logger.info(f"Raid detected in guild {guild.id}")
+
+        raiders = [member for joined_at, member in state.recent if now - joined_at < state.window]
+
+        for member in raiders:
+            await self.quarantine(member, config)
+
+        logging_module = self.bot.get_cog("Logging")
+
+        if config.anti_raid.alert_channel and logging_module:
+            actions = []
+            if config.anti_raid.pause_auto_role and config.utilities.auto_role:
+                actions.append("auto role paused")
+            if config.anti_raid.quarantine_role:
+                actions.append(
+                    f"new members quarantined with <@&{config.anti_raid.quarantine_role}>"
+                )
+
+            await logging_module.send_log_message(
+                guild.id,
+                config.anti_raid.alert_channel,
+                "Raid detected",
+                config.colors.danger,
+                description=f"{len(raiders)} members joined in the last {state.window} seconds.",
+                priority=LogPriority.HIGH,
+                account_ages="\n".join(
+                    f"Younger than one {bucket}: {counter.count(now)}"
+                    for bucket, counter in state.ages.items()
+                ),
+                members=(
+                    " ".join(member.mention for member in raiders[:MAX_MENTIONED_RAIDERS]) or "None"
+                ),
+                actions=", ".join(actions) or "None",
+            )
+
+    async def quarantine(self, member: Member, config: GuildConfig) -> None:
+        """Give the quarantine role to the member, if configured."""
+        if role_id := config.anti_raid.quarantine_role:
+            with suppress(HTTPException):
+                await member.add_roles(Object(role_id), reason="Joined during a raid")
+
+    def is_auto_role_paused(self, guild_id: int, config: GuildConfig) -> bool:
+        """Whether the auto role shouldn't be given because of an ongoing raid."""
+        return config.anti_raid.pause_auto_role and self.is_raid_active(guild_id)
+
+
+def setup(bot: StarBot) -> None:
+    """Load the anti-raid module."""
+    bot.add_cog(AntiRaid(bot))
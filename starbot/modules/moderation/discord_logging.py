@@ -1,17 +1,21 @@
 import logging
-from collections import deque
 from datetime import datetime
-from typing import Optional
+from pathlib import Path
+from typing import Iterable, Optional
 
 from disnake import (
+    AuditLogAction,
+    AuditLogEntry,
     CategoryChannel,
     Embed,
     Emoji,
+    File,
     Guild,
     GuildScheduledEvent,
-    HTTPException,
     Member,
-    PermissionOverwrite,
+    Message,
+    Object,
+    RawBulkMessageDeleteEvent,
     RawMessageDeleteEvent,
     RawMessageUpdateEvent,
     Role,
@@ -26,7 +30,25 @@ from disnake.ext.commands import Cog
 from disnake.utils import snowflake_time
 
 from starbot.bot import StarBot
-from starbot.utils.pluralkit import is_deleted_by_pluralkit
+from starbot.constants import (
+    EVENT_SINK_PATH,
+    EVENT_SINK_RETENTION,
+    LOG_FLUSH_DELAY,
+    MESSAGE_STORE_BUDGET,
+)
+from starbot.modules.internals.member_updates import MemberUpdate
+from starbot.modules.moderation._audit_log import Actor, ActorLookup, AuditLogIndex
+from starbot.modules.moderation._log_sender import LogPriority, LogSender
+from starbot.modules.moderation._suppressions import EventSuppressor
+from starbot.modules.moderation._transcript import (
+    MAX_TRANSCRIPT_SIZE,
+    TranscriptLine,
+    build_transcript,
+)
+from starbot.utils.event_sink import EventSink
+from starbot.utils.message_store import MessageStore
+from starbot.utils.permissions import PermissionChange, diff_overwrites, diff_permissions
+from starbot.utils.pluralkit import PluralKitClient
 from starbot.utils.text import truncate
 from starbot.utils.time import format_timestamp
 
@@ -59,14 +81,19 @@ CHANNEL_TO_HUMAN_READABLE = {
     CategoryChannel: None,  # Do not log new categories
     StageChannel: "stage",
 }
+# Audit log actions which can cause a channel update
+CHANNEL_UPDATE_ACTIONS = (
+    AuditLogAction.channel_update,
+    AuditLogAction.overwrite_create,
+    AuditLogAction.overwrite_update,
+    AuditLogAction.overwrite_delete,
+)
 PERM_EMOJIS = {
     True: "\N{LARGE GREEN SQUARE}",
     False: "\N{LARGE RED SQUARE}",
     None: "\N{WHITE LARGE SQUARE}",
 }
 
-EMPTY_PERM_OVERWRITE = PermissionOverwrite()
-
 
 def _get_human_readable_channel_type(channel: GuildChannel) -> Optional[str]:
     for key, value in CHANNEL_TO_HUMAN_READABLE.items():
@@ -74,20 +101,62 @@ def _get_human_readable_channel_type(channel: GuildChannel) -> Optional[str]:
             return value
 
 
+def _format_permission_changes(changes: list[PermissionChange]) -> str:
+    return "\n".join(
+        f"{change.name.replace('_', ' ').capitalize()}: "
+        f"{PERM_EMOJIS[change.before]} "
+        f"{ARROW} "
+        f"{PERM_EMOJIS[change.after]}"
+        for change in changes
+    )
+
+
+def _format_actor(actor: Actor) -> str:
+    if isinstance(actor, Object):
+        return f"<@{actor.id}> (`{actor.id}`)"
+    return f"{actor.mention} (`{actor}`, `{actor.id}`)"
+
+
 class Logging(Cog):
     """Log various discord events related to the server."""
 
     def __init__(self, bot: StarBot) -> None:
         self.bot = bot
-        self.ignored_events = deque(maxlen=15)
+        self.suppressions = EventSuppressor()
+
+        self.sender = LogSender(LOG_FLUSH_DELAY)
+        self.pluralkit = PluralKitClient(self.bot.aiohttp)
+        self.messages = MessageStore(MESSAGE_STORE_BUDGET)
+        self.audit_log = AuditLogIndex()
+        self.events = (
+            EventSink(Path(EVENT_SINK_PATH), EVENT_SINK_RETENTION) if EVENT_SINK_PATH else None
+        )
+        self.bot.shutdown_hooks.append(self.close)
+
+    def cog_unload(self) -> None:
+        """Send the buffered log messages."""
+        self.bot.shutdown_hooks.remove(self.close)
+        self.bot.loop.create_task(self.close())
+
+    async def close(self) -> None:
+        """Deliver the buffered log messages and write the buffered events."""
+        await self.sender.close()
 
-    def ignore_event(self, event: str, user_id: Optional[int]) -> None:
+        if self.events:
+            await self.events.close()
+
+    def ignore_event(self, guild_id: int, event: str, user_id: Optional[int]) -> None:
         """
         Ignore an event with the provided key.
 
-        This will prevent the event from being logged.
+        This will prevent the event from being logged for a short while.
         """
-        self.ignored_events.append(f"{event}:{user_id}")
+        self.suppressions.ignore(guild_id, event, user_id)
+
+    def ignore_messages(self, guild_id: int, message_ids: Iterable[int]) -> None:
+        """Don't log the deletion of these messages, which is summarized elsewhere."""
+        for message_id in message_ids:
+            self.suppressions.ignore(guild_id, "message_deleted", message_id)
 
     async def send_log_message(
         self,
@@ -98,10 +167,20 @@ class Logging(Cog):
         user: Optional[User | Member] = None,
         description: Optional[str] = None,
         extra_inline: bool = False,
+        priority: LogPriority = LogPriority.NORMAL,
+        file: Optional[File] = None,
+        moderator: Optional[Actor | ActorLookup] = None,
         **extras: str,
     ) -> None:
-        """Send a message to the logging channel."""
-        if f"{title.replace(' ', '_').lower()}:{getattr(user, 'id', None)}" in self.ignored_events:
+        """
+        Queue a message to be sent to the logging channel.
+
+        The message is delivered in the background, so this returns without waiting for Discord.
+        A moderator to find in the audit log is only looked up if the event is logged.
+        """
+        event = title.replace(" ", "_").lower()
+
+        if self.suppressions.is_suppressed(guild_id, event, getattr(user, "id", None)):
             return
 
         # Fetch the log channel from the server
@@ -118,6 +197,23 @@ class Logging(Cog):
             logger.debug("Ignoring logging event because it originates from the bot.")
             return
 
+        if isinstance(moderator, ActorLookup):
+            moderator = await self.audit_log.find_actor(
+                guild, moderator.actions, moderator.target_id
+            )
+
+        if self.events:
+            self.events.record(
+                event,
+                guild_id,
+                getattr(user, "id", None),
+                {
+                    "description": description,
+                    "moderator_id": getattr(moderator, "id", None),
+                    **extras,
+                },
+            )
+
         embed = Embed(title=title, color=color, timestamp=datetime.now())
 
         # Add the description if provided
@@ -131,16 +227,22 @@ class Logging(Cog):
             )
             embed.set_thumbnail(url=user.display_avatar.url)
 
+        # Add who performed the action if known
+        if moderator:
+            embed.add_field(name="Moderator", value=_format_actor(moderator), inline=False)
+
         # Add any extra fields
         for key, value in extras.items():
             embed.add_field(
                 name=key.replace("_", " ").capitalize(), value=value, inline=extra_inline
             )
 
-        try:
-            await channel.send(embed=embed)
-        except HTTPException as e:
-            logger.debug(f"Couldn't send logging message: {e}")
+        self.sender.send(channel, embed, priority, file)
+
+    @Cog.listener("on_audit_log_entry_create")
+    async def index_audit_log_entries(self, entry: AuditLogEntry) -> None:
+        """Keep the new audit log entries, to attribute the logged events."""
+        self.audit_log.add(entry)
 
     @Cog.listener("on_member_join")
     async def log_member_joins(self, member: Member) -> None:
@@ -179,9 +281,29 @@ class Logging(Cog):
                 joined=format_timestamp(member.joined_at),
             )
 
+    @Cog.listener("on_message")
+    async def store_message(self, message: Message) -> None:
+        """Keep a compact copy of the message, so its edits and deletion can be logged."""
+        if message.guild is None:
+            return
+
+        self.messages.add(
+            message.guild.id,
+            message.id,
+            message.channel.id,
+            message.author.id,
+            message.content,
+            len(message.attachments),
+        )
+
     @Cog.listener("on_raw_message_delete")
     async def log_message_deletes(self, payload: RawMessageDeleteEvent) -> None:
         """Log deleted messages."""
+        stored = self.messages.pop(payload.guild_id, payload.message_id)
+
+        if self.suppressions.is_suppressed(payload.guild_id, "message_deleted", payload.message_id):
+            return
+
         config = await self.bot.get_config(guild_id=payload.guild_id)
 
         if not config.logging.channels.messages:
@@ -192,7 +314,7 @@ class Logging(Cog):
 
         # The message was cached
         if payload.cached_message:
-            if await is_deleted_by_pluralkit(self.bot, payload.message_id):
+            if await self.pluralkit.is_deleted_by_pluralkit(payload.cached_message):
                 logging.debug(
                     f"Ignoring message {payload.message_id} because "
                     f"it has been proxied by pluralkit"
@@ -204,6 +326,7 @@ class Logging(Cog):
                 channel_id=config.logging.channels.messages,
                 title="Message deleted",
                 color=config.colors.warning,
+                priority=LogPriority.LOW,
                 user=payload.cached_message.author,
                 description=payload.cached_message.content,
                 channel=(
@@ -219,21 +342,35 @@ class Logging(Cog):
                 ),
             )
         else:
-            logger.debug("Message wasn't cached")
+            guild = self.bot.get_guild(payload.guild_id)
 
-            if channel := self.bot.get_guild(payload.guild_id).get_channel(payload.channel_id):
+            if channel := guild.get_channel(payload.channel_id):
                 channel_text = f"{channel.mention} (`{channel}`, `{channel.id}`)"
             else:
                 channel_text = f"<#{payload.channel_id}> (`unknown`, `{payload.channel_id}`)"
 
+            # Fall back to our own store if disnake didn't cache the message
+            if stored:
+                user = guild.get_member(stored.author_id) or self.bot.get_user(stored.author_id)
+                description = stored.content
+                extras = {"attachments": str(stored.attachments)}
+            else:
+                logger.debug("Message wasn't cached")
+
+                user = None  # We don't know who deleted the message
+                description = "Message content cannot be displayed"
+                extras = {}
+
             await self.send_log_message(
                 guild_id=payload.guild_id,
                 channel_id=config.logging.channels.messages,
                 title="Message deleted",
                 color=config.colors.warning,
-                user=None,  # We don't know who deleted the message
-                description="Message content cannot be displayed",
+                priority=LogPriority.LOW,
+                user=user,
+                description=description,
                 channel=channel_text,
+                **extras,
                 sent=format_timestamp(snowflake_time(payload.message_id)),
                 message_id=(
                     f"[`{payload.message_id}`]"
@@ -241,6 +378,78 @@ class Logging(Cog):
                 ),
             )
 
+    @Cog.listener("on_raw_bulk_message_delete")
+    async def log_bulk_message_deletes(self, payload: RawBulkMessageDeleteEvent) -> None:
+        """Log messages deleted in bulk as a single entry, with a transcript of their content."""
+        # Always drop the messages from the store, even if they aren't logged
+        stored = {
+            message_id: self.messages.pop(payload.guild_id, message_id)
+            for message_id in payload.message_ids
+        }
+        message_ids = [
+            message_id
+            for message_id in payload.message_ids
+            if not self.suppressions.is_suppressed(payload.guild_id, "message_deleted", message_id)
+        ]
+
+        if not message_ids:
+            return
+
+        config = await self.bot.get_config(guild_id=payload.guild_id)
+
+        if not config.logging.channels.messages:
+            return
+
+        guild = self.bot.get_guild(payload.guild_id)
+        lines = {}
+
+        for message_id in message_ids:
+            if record := stored[message_id]:
+                author = guild.get_member(record.author_id) or self.bot.get_user(record.author_id)
+                lines[message_id] = TranscriptLine(
+                    message_id,
+                    f"{author or 'Unknown user'} ({record.author_id})",
+                    record.content,
+                    record.attachments,
+                )
+            else:
+                lines[message_id] = TranscriptLine(message_id, None, None)
+
+        # Messages cached by disnake are the most up to date
+        for message in payload.cached_messages:
+            if message.id not in lines:
+                continue
+
+            lines[message.id] = TranscriptLine(
+                message.id,
+                f"{message.author} ({message.author.id})",
+                message.content,
+                len(message.attachments),
+            )
+
+        transcript = build_transcript(
+            lines.values(), min(MAX_TRANSCRIPT_SIZE, guild.filesize_limit)
+        )
+
+        if channel := guild.get_channel(payload.channel_id):
+            channel_text = f"{channel.mention} (`{channel}`, `{channel.id}`)"
+        else:
+            channel_text = f"<#{payload.channel_id}> (`unknown`, `{payload.channel_id}`)"
+
+        known = sum(line.content is not None for line in lines.values())
+
+        await self.send_log_message(
+            guild_id=payload.guild_id,
+            channel_id=config.logging.channels.messages,
+            title="Messages bulk deleted",
+            color=config.colors.warning,
+            moderator=ActorLookup(AuditLogAction.message_bulk_delete, payload.channel_id),
+            file=File(transcript, f"deleted-messages-{payload.channel_id}.txt"),
+            channel=channel_text,
+            messages=str(len(message_ids)),
+            content_available=f"{known}/{len(message_ids)}",
+        )
+
     @Cog.listener("on_raw_message_edit")
     async def log_message_edits(self, payload: RawMessageUpdateEvent) -> None:
         """Log edited messages."""
@@ -249,6 +458,21 @@ class Logging(Cog):
         if "content" not in payload.data:
             return
 
+        stored = self.messages.get(payload.guild_id, payload.message_id)
+
+        if payload.cached_message:
+            before = payload.cached_message.content
+        elif stored:
+            before = stored.content
+        else:
+            before = "Cannot display previous content"
+
+        if before == payload.data["content"]:
+            return
+
+        if stored:
+            self.messages.update(payload.guild_id, payload.message_id, payload.data["content"])
+
         config = await self.bot.get_config(guild_id=payload.guild_id)
 
         if not config.logging.channels.messages:
@@ -266,14 +490,6 @@ class Logging(Cog):
         else:
             user = None
 
-        if payload.cached_message:
-            before = payload.cached_message.content
-
-            if before == payload.data["content"]:
-                return
-        else:
-            before = "Cannot display previous content"
-
         if "edited_timestamp" not in payload.data or not isinstance(
             payload.data["edited_timestamp"], str
         ):
@@ -286,6 +502,7 @@ class Logging(Cog):
             channel_id=config.logging.channels.messages,
             title="Message edited",
             color=config.colors.info,
+            priority=LogPriority.LOW,
             user=user,
             description=(
                 f"**Before:**\n{truncate(before, MAX_EDIT_LENGTH)}"
@@ -300,76 +517,57 @@ class Logging(Cog):
             ),
         )
 
-    @Cog.listener("on_member_update")
-    async def log_nickname_changes(self, before: Member, after: Member) -> None:
+    @Cog.listener("on_member_nick_update")
+    async def log_nickname_changes(self, update: MemberUpdate) -> None:
         """Log the nickname changes of a member."""
-        if before.nick == after.nick:
-            return
-
-        config = await self.bot.get_config(guild_id=before.guild.id)
-
-        if config.logging.channels.members:
+        if update.config.logging.channels.members:
             await self.send_log_message(
-                guild_id=before.guild.id,
-                channel_id=config.logging.channels.members,
+                guild_id=update.before.guild.id,
+                channel_id=update.config.logging.channels.members,
                 title="Nickname changed",
-                color=config.colors.info,
-                user=before,
-                before=f"`{before.nick}`",
-                after=f"`{after.nick}`",
+                color=update.config.colors.info,
+                user=update.before,
+                before=f"`{update.before.nick}`",
+                after=f"`{update.after.nick}`",
             )
 
-    @Cog.listener("on_member_update")
-    async def log_verified_members(self, before: Member, after: Member) -> None:
+    @Cog.listener("on_member_verified")
+    async def log_verified_members(self, update: MemberUpdate) -> None:
         """Log whenever a member passes verification."""
-        if before.pending is False or after.pending is True:
-            return
-
-        config = await self.bot.get_config(guild_id=before.guild.id)
-
-        if config.logging.channels.joins:
+        if update.config.logging.channels.joins:
             await self.send_log_message(
-                guild_id=before.guild.id,
-                channel_id=config.logging.channels.joins,
+                guild_id=update.before.guild.id,
+                channel_id=update.config.logging.channels.joins,
                 title="Member passed verification",
-                color=config.colors.info,
-                user=before,
-                joined=format_timestamp(before.joined_at),
+                color=update.config.colors.info,
+                user=update.before,
+                joined=format_timestamp(update.before.joined_at),
             )
 
-    @Cog.listener("on_member_update")
-    async def log_member_roles(self, before: Member, after: Member) -> None:
+    @Cog.listener("on_member_roles_update")
+    async def log_member_roles(self, update: MemberUpdate) -> None:
         """Log updated roles for a member."""
-        if set(before.roles) == set(after.roles):
-            return
-
-        config = await self.bot.get_config(guild_id=before.guild.id)
-
-        if config.logging.channels.members:
+        if update.config.logging.channels.members:
             fields = {}
 
-            removed_roles = set(before.roles) - set(after.roles)
-            added_roles = set(after.roles) - set(before.roles)
-
-            if removed_roles:
+            if update.removed:
                 fields["roles_removed"] = ", ".join(
-                    f"{role.mention} (`{role}`, `{role.id}`)" for role in removed_roles
+                    f"{role.mention} (`{role}`, `{role.id}`)" for role in update.removed
                 )
 
-            if added_roles:
+            if update.added:
                 fields["roles_added"] = ", ".join(
-                    f"{role.mention} (`{role}`, `{role.id}`)" for role in added_roles
+                    f"{role.mention} (`{role}`, `{role.id}`)" for role in update.added
                 )
 
-            if len(fields) > 0:
-                await self.send_log_message(
-                    guild_id=before.guild.id,
-                    channel_id=config.logging.channels.members,
-                    title="Member roles updated",
-                    color=config.colors.info,
-                    user=before,
-                    **fields,
-                )
+            await self.send_log_message(
+                guild_id=update.before.guild.id,
+                channel_id=update.config.logging.channels.members,
+                title="Member roles updated",
+                color=update.config.colors.info,
+                user=update.before,
+                **fields,
+            )
 
     @Cog.listener("on_member_ban")
     async def log_banned_member(self, guild: Guild, user: User) -> None:
@@ -383,6 +581,8 @@ class Logging(Cog):
                 title="User banned",
                 color=config.colors.danger,
                 user=user,
+                priority=LogPriority.HIGH,
+                moderator=ActorLookup(AuditLogAction.ban, user.id),
             )
 
     @Cog.listener("on_member_unban")
@@ -397,6 +597,8 @@ class Logging(Cog):
                 title="User unbanned",
                 color=config.colors.success,
                 user=user,
+                priority=LogPriority.HIGH,
+                moderator=ActorLookup(AuditLogAction.unban, user.id),
             )
 
     @Cog.listener("on_guild_channel_create")
@@ -437,6 +639,7 @@ class Logging(Cog):
                 color=config.colors.danger,
                 user=None,
                 description=f"`#{channel}` (`{channel.id}`)",
+                moderator=ActorLookup(AuditLogAction.channel_delete, channel.id),
             )
 
     @Cog.listener("on_guild_channel_update")
@@ -476,28 +679,16 @@ class Logging(Cog):
                         f"`{getattr(after, field_name)}`"
                     )
 
-            # Check if the overwrites changed
-            all_subjects = set(before.overwrites.keys()).union(set(after.overwrites.keys()))
-            for subject in all_subjects:
-                perms_before = dict(before.overwrites.get(subject, EMPTY_PERM_OVERWRITE))
-                perms_after = dict(after.overwrites.get(subject, EMPTY_PERM_OVERWRITE))
-
-                if perms_before != perms_after:
-                    changes = []
-
-                    for perm, perm_before, perm_after in zip(
-                        perms_before.keys(), perms_before.values(), perms_after.values()
-                    ):
-                        if perm_before != perm_after:
-                            changes.append(
-                                f"{perm.replace('_', ' ').capitalize()}: "
-                                f"{PERM_EMOJIS[perm_before]} "
-                                f"{ARROW} "
-                                f"{PERM_EMOJIS[perm_after]}"
-                            )
-
-                    subject_type = "role" if isinstance(subject, Role) else "member"
-                    fields[f"overwrites_for_{subject_type}_{subject}"] = "\n".join(changes)
+            # Check if the overwrites changed, on the raw values to avoid building the objects
+            overwrite_changes = diff_overwrites(before._overwrites, after._overwrites)
+
+            for target_id, changes in overwrite_changes.items():
+                if role := after.guild.get_role(target_id):
+                    key = f"overwrites_for_role_{role}"
+                else:
+                    key = f"overwrites_for_member_{after.guild.get_member(target_id) or target_id}"
+
+                fields[key] = _format_permission_changes(changes)
 
             if len(fields) > 0:
                 await self.send_log_message(
@@ -507,6 +698,7 @@ class Logging(Cog):
                     color=config.colors.info,
                     user=None,
                     channel=f"{after.mention} (`{after}`, `{after.id}`)",
+                    moderator=ActorLookup(CHANNEL_UPDATE_ACTIONS, after.id),
                     **fields,
                 )
 
@@ -659,6 +851,7 @@ class Logging(Cog):
                 color=config.colors.danger,
                 user=None,
                 description=f"`{role}` (`{role.id}`)",
+                moderator=ActorLookup(AuditLogAction.role_delete, role.id),
                 role_color=hex(role.color.value) if role.color.value != 0 else None,
                 position=str(role.position),
             )
@@ -699,24 +892,8 @@ class Logging(Cog):
                     )
 
             # Check if the permission changed
-            if before.permissions != after.permissions:
-                changes = []
-
-                perms_before = dict(before.permissions)
-                perms_after = dict(after.permissions)
-
-                for perm, perm_before, perm_after in zip(
-                    perms_before.keys(), perms_before.values(), perms_after.values()
-                ):
-                    if perm_before != perm_after:
-                        changes.append(
-                            f"{perm.replace('_', ' ').capitalize()}: "
-                            f"{PERM_EMOJIS[perm_before]} "
-                            f"{ARROW} "
-                            f"{PERM_EMOJIS[perm_after]}"
-                        )
-
-                fields["permissions"] = "\n".join(changes)
+            if changes := diff_permissions(before.permissions.value, after.permissions.value):
+                fields["permissions"] = _format_permission_changes(changes)
 
             if len(fields) > 0:
                 await self.send_log_message(
@@ -726,6 +903,7 @@ class Logging(Cog):
                     color=config.colors.info,
                     user=None,
                     role=f"{after.mention} (`{after}`, `{after.id}`)",
+                    moderator=ActorLookup(AuditLogAction.role_update, after.id),
                     **fields,
                 )
 
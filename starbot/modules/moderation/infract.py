@@ -1,17 +1,20 @@
+import asyncio
 import logging
-from datetime import datetime, timedelta
-from http.client import HTTPException
-from typing import Optional
+import re
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+from typing import Iterable, Optional
 
 import arrow
 from dateutil.relativedelta import relativedelta
-from disnake import Forbidden, Member, User
+from disnake import File, Forbidden, Guild, HTTPException, Member, Object, User
 from disnake.ext.commands import Cog, slash_command
-from sqlalchemy import and_, select, update
+from sqlalchemy import and_, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from starbot.bot import StarBot
 from starbot.checks import require_permission
-from starbot.constants import ACI
+from starbot.constants import ACI, ADVISORY_LOCKS
 from starbot.converters import autocomplete_relativedelta, convert_relativedelta
 from starbot.models.infraction import InfractionModel, InfractionTypes
 from starbot.modules.moderation._constants import (
@@ -21,42 +24,81 @@ from starbot.modules.moderation._constants import (
     INFRACTIONS_WITH_DURATIONS,
     UNIQUE_INFRACTIONS,
 )
+from starbot.modules.moderation._dm_outbox import DMOutbox
+from starbot.modules.moderation._infraction_summaries import InfractionSummaries
+from starbot.modules.moderation._log_sender import LogPriority
+from starbot.modules.moderation._rollups import record_infractions
 from starbot.modules.moderation.discord_logging import Logging, format_timestamp
-from starbot.utils.lock import argument_lock
+from starbot.utils.lock import AdvisoryLocks, KeyedLock
 from starbot.utils.time import TimestampFormats, discord_timestamp, humanized_delta
 
 EMOJI_APPLIED = "\N{HAMMER}"
 EMOJI_CANCELLED = "\N{HAMMER AND WRENCH}"
 EMOJI_DM_SUCCESS = "\N{ENVELOPE WITH DOWNWARDS ARROW ABOVE}"
+EMOJI_DM_QUEUED = "\N{OUTBOX TRAY}"
 
 # Limitation due to the Discord API
 MAX_TIMEOUT_DURATION = timedelta(days=28)
 
+# The user must still share a guild with the bot to receive the DM
+DM_BEFORE_ACTION = {InfractionTypes.KICK, InfractionTypes.BAN}
+
+# Maximum number of users banned by a single mass ban
+MAX_MASS_BAN = 1000
+# Number of ban requests in flight at once, disnake waits on the rate limits on its own
+MASS_BAN_CONCURRENCY = 5
+
+USER_ID_REGEX = re.compile(r"\d{15,20}")
+
+# Serialize the infractions of each member, shared by every command changing them
+INFRACTION_LOCKS = KeyedLock()
+ADVISORY_LOCK_NAMESPACE = 1
+
 logger = logging.getLogger(__name__)
 
 
+class InfractionError(Exception):
+    """Raised when an infraction cannot be applied, with a message for the moderator."""
+
+
 class Infract(Cog):
     """Module providing commands to infract users."""
 
     def __init__(self, bot: StarBot):
         self.bot = bot
+        self.outbox = DMOutbox(bot)
+        self.summaries = InfractionSummaries(bot)
 
-    @argument_lock(3)  # user
-    async def infract(
+        # Also lock the infractions across processes, within the transaction storing them
+        self.advisory_locks = AdvisoryLocks(ADVISORY_LOCK_NAMESPACE) if ADVISORY_LOCKS else None
+        self.bot.shutdown_hooks.append(self.outbox.close)
+
+    def cog_unload(self) -> None:
+        """Deliver the queued DMs."""
+        self.bot.shutdown_hooks.remove(self.outbox.close)
+        self.bot.loop.create_task(self.outbox.close())
+
+    @INFRACTION_LOCKS.locked(lambda guild, user: (guild.id, user.id))
+    async def apply_infraction(
         self,
-        inter: ACI,
+        guild: Guild,
         type_: InfractionTypes,
-        user: User,
-        moderator: User,
+        user: User | Member,
+        moderator: User | Member,
         reason: Optional[str],
         duration: Optional[relativedelta] = None,
-    ) -> None:
-        """Infract a user."""
-        await inter.response.defer(ephemeral=type_ in HIDDEN_INFRACTIONS)
+    ) -> InfractionModel:
+        """
+        Apply an infraction to a user, then store and log it.
 
-        config = await self.bot.get_config(inter)
+        Raises InfractionError, with a message for the moderator, if it cannot be applied.
+        """
+        config = await self.bot.get_config(guild_id=guild.id)
 
         async with self.bot.Session() as session:
+            if self.advisory_locks:
+                await self.advisory_locks.lock(session, (guild.id, user.id))
+
             # Make sure the duration is set appropriately
             if duration is not None and type_ not in INFRACTIONS_WITH_DURATIONS:
                 raise ValueError(f"Infraction type {type_} does not support a duration")
@@ -65,29 +107,15 @@ class Infract(Cog):
 
             # Make sure we don't have an already active infraction
             if type_ in UNIQUE_INFRACTIONS:
-                infractions = await session.execute(
-                    select(InfractionModel).where(
-                        and_(
-                            InfractionModel.guild_id == inter.guild.id,
-                            InfractionModel.user_id == user.id,
-                            InfractionModel.type == type_,
-                        )
-                    )
+                # Other processes may add infractions, reload them now that the lock is held
+                summary = await self.summaries.get(
+                    guild.id, user.id, refresh=ADVISORY_LOCKS, session=session
                 )
 
-                active_infraction = None
-                for infr in infractions:
-                    if infr[0].active:
-                        active_infraction = infr[0]
-                        break
-
-                if active_infraction is not None:
-                    await inter.send(
-                        f":x: That user already has an active infraction. "
-                        f"See #{active_infraction.id}.",
-                        ephemeral=True,
+                if (active_infraction := summary.get_active(type_)) is not None:
+                    raise InfractionError(
+                        f"That user already has an active infraction. See #{active_infraction.id}."
                     )
-                    return
 
             # Convert duration to timedelta
             dateutil_duration = duration
@@ -95,7 +123,14 @@ class Infract(Cog):
                 now = arrow.utcnow()
                 duration = now + duration - now
 
+                if type_ == InfractionTypes.MUTE and duration > MAX_TIMEOUT_DURATION:
+                    raise InfractionError(
+                        f"Mute duration cannot exceed {MAX_TIMEOUT_DURATION.days} days "
+                        "due to Discord API limitations."
+                    )
+
             dm_sent = None
+            queued_dm = None
 
             if type_ not in HIDDEN_INFRACTIONS:
                 # We try to check early if the bot should be able to apply the infraction or not
@@ -104,31 +139,29 @@ class Infract(Cog):
 
                 match type_:
                     case InfractionTypes.MUTE:
-                        can_continue = inter.guild.me.guild_permissions.moderate_members
+                        can_continue = guild.me.guild_permissions.moderate_members
                     case InfractionTypes.KICK:
-                        can_continue = inter.guild.me.guild_permissions.kick_members
+                        can_continue = guild.me.guild_permissions.kick_members
                     case InfractionTypes.BAN:
-                        can_continue = inter.guild.me.guild_permissions.ban_members
+                        can_continue = guild.me.guild_permissions.ban_members
 
                 if type_ in INFRACTION_REQUIRING_RANK:
                     if (
                         isinstance(user, Member)
-                        and inter.guild.me.top_role.position < user.top_role.position
+                        and guild.me.top_role.position < user.top_role.position
                     ):
                         can_continue = False
 
-                    if inter.guild.owner_id == user.id:
+                    if guild.owner_id == user.id:
                         can_continue = False
 
                 if not can_continue:
-                    await inter.send(
-                        ":x: The bot doesn't have the permission to apply this infraction.",
-                        ephemeral=True,
+                    raise InfractionError(
+                        "The bot doesn't have the permission to apply this infraction."
                     )
-                    return
 
                 # Send a DM to the user
-                message = f"**You have received a {INFRACTION_NAME[type_]} in {inter.guild.name}**"
+                message = f"**You have received a {INFRACTION_NAME[type_]} in {guild.name}**"
                 if reason:
                     message += f" for the following reason: {reason}"
 
@@ -142,11 +175,11 @@ class Infract(Cog):
                 else:
                     message += "."
 
-                dm_sent = True
-                try:
-                    await user.send(message)
-                except (HTTPException, Forbidden):
-                    dm_sent = False
+                if type_ in DM_BEFORE_ACTION:
+                    dm_sent = await self.outbox.send_now(user, message)
+                else:
+                    # Delivered once the infraction is stored, which records the outcome
+                    queued_dm = message
 
             logging_module: Optional[Logging] = self.bot.get_cog("Logging")
 
@@ -158,110 +191,129 @@ class Infract(Cog):
                     case InfractionTypes.WARNING:
                         pass
                     case InfractionTypes.KICK:
-                        await inter.guild.kick(user, reason=reason)
+                        await guild.kick(user, reason=reason)
 
                         if logging_module:
-                            logging_module.ignore_event("user_left", user.id)
+                            logging_module.ignore_event(guild.id, "user_left", user.id)
                     case InfractionTypes.MUTE:
-                        if duration > MAX_TIMEOUT_DURATION:
-                            await inter.send(
-                                f":x: Mute duration cannot exceed {MAX_TIMEOUT_DURATION.days} days "
-                                "due to Discord API limitations.",
-                                ephemeral=True,
-                            )
-                            return
-
-                        await inter.guild.timeout(user, duration=duration, reason=reason)
+                        await guild.timeout(user, duration=duration, reason=reason)
                     case InfractionTypes.BAN:
-                        await inter.guild.ban(user, reason=reason)
+                        await guild.ban(user, reason=reason)
 
                         if logging_module:
-                            logging_module.ignore_event("user_left", user.id)
+                            logging_module.ignore_event(guild.id, "user_left", user.id)
                     case _:
                         raise ValueError(f"Unknown infraction type {type_}")
             except Forbidden:
-                await inter.send(
-                    ":x: The bot doesn't have the permission to apply this infraction.",
-                    ephemeral=True,
+                raise InfractionError(
+                    "The bot doesn't have the permission to apply this infraction."
                 )
-                return
 
             # Create the infraction
             infraction = InfractionModel(
-                guild_id=inter.guild.id,
+                guild_id=guild.id,
                 user_id=user.id,
                 moderator_id=moderator.id,
                 type=type_,
                 reason=reason,
                 duration=duration,
-                created_at=inter.created_at.replace(tzinfo=None),
+                created_at=datetime.utcnow(),
                 dm_sent=dm_sent,
             )
             session.add(infraction)
+            await record_infractions(
+                session, guild.id, type_, moderator.id, infraction.created_at, [user.id]
+            )
             await session.commit()
-
-            # Send the infraction message
-            emoji_text = EMOJI_DM_SUCCESS if type_ not in HIDDEN_INFRACTIONS and dm_sent else ""
-            action_text = f"Applied {INFRACTION_NAME[type_]} to {user.mention}"
-            duration_text = (
-                f" until {discord_timestamp(infraction.created_at + duration)}" if duration else ""
+            self.summaries.add(infraction)
+
+            if queued_dm:
+                self.outbox.send(user, queued_dm, infraction)
+
+        # Send a message to the log channel
+        if config.logging.channels.moderation is not None and logging_module:
+            extras = (
+                {
+                    "duration": f"{humanized_delta(dateutil_duration)}",
+                    "expires": format_timestamp(infraction.created_at + duration),
+                }
+                if duration
+                else {}
             )
-            reason_text = f": {reason}" if reason else ""
 
-            await inter.send(
-                (
-                    f"{emoji_text} {EMOJI_APPLIED} {action_text}"
-                    f"{duration_text}{reason_text} (#{infraction.id})."
-                ),
-                ephemeral=type_ in HIDDEN_INFRACTIONS,
+            await logging_module.send_log_message(
+                guild.id,
+                config.logging.channels.moderation,
+                f"{INFRACTION_NAME[type_].capitalize()} applied",
+                config.colors.warning,
+                user,
+                moderator=moderator,
+                reason=reason,
+                priority=LogPriority.HIGH,
+                **extras,
             )
 
-            # Send a message to the log channel
-            if config.logging.channels.moderation is not None and logging_module:
-                extras = (
-                    {
-                        "duration": f"{humanized_delta(dateutil_duration)}",
-                        "expires": format_timestamp(infraction.created_at + duration),
-                    }
-                    if duration
-                    else {}
-                )
+        return infraction
 
-                await logging_module.send_log_message(
-                    inter.guild.id,
-                    config.logging.channels.moderation,
-                    f"{INFRACTION_NAME[type_].capitalize()} applied",
-                    config.colors.warning,
-                    user,
-                    moderator=f"{moderator.mention} (`{moderator}`, `{moderator.id}`)",
-                    reason=reason,
-                    **extras,
-                )
+    async def infract(
+        self,
+        inter: ACI,
+        type_: InfractionTypes,
+        user: User,
+        moderator: User,
+        reason: Optional[str],
+        duration: Optional[relativedelta] = None,
+    ) -> None:
+        """Infract a user from a command, reporting the outcome to the moderator."""
+        await inter.response.defer(ephemeral=type_ in HIDDEN_INFRACTIONS)
 
-    @argument_lock(3)  # user
+        try:
+            infraction = await self.apply_infraction(
+                inter.guild, type_, user, moderator, reason, duration
+            )
+        except InfractionError as e:
+            await inter.send(f":x: {e}", ephemeral=True)
+            return
+
+        # Send the infraction message
+        if infraction.dm_sent:
+            emoji_text = EMOJI_DM_SUCCESS
+        elif type_ not in HIDDEN_INFRACTIONS | DM_BEFORE_ACTION:
+            emoji_text = EMOJI_DM_QUEUED
+        else:
+            emoji_text = ""
+
+        action_text = f"Applied {INFRACTION_NAME[type_]} to {user.mention}"
+        duration_text = (
+            f" until {discord_timestamp(infraction.created_at + infraction.duration)}"
+            if infraction.duration
+            else ""
+        )
+        reason_text = f": {reason}" if reason else ""
+
+        await inter.send(
+            (
+                f"{emoji_text} {EMOJI_APPLIED} {action_text}"
+                f"{duration_text}{reason_text} (#{infraction.id})."
+            ),
+            ephemeral=type_ in HIDDEN_INFRACTIONS,
+        )
+
+    @INFRACTION_LOCKS.locked(lambda inter, user: (inter.guild.id, user.id))
     async def cancel_infraction(
         self, inter: ACI, user: User, moderator: User, type_: InfractionTypes
     ) -> None:
         """Cancel an infraction."""
         async with self.bot.Session() as session:
+            if self.advisory_locks:
+                await self.advisory_locks.lock(session, (inter.guild.id, user.id))
+
             # Make sure the infraction exists
-            infractions = await session.execute(
-                select(InfractionModel).where(
-                    and_(
-                        InfractionModel.guild_id == inter.guild.id,
-                        InfractionModel.user_id == user.id,
-                        InfractionModel.type == type_,
-                    )
-                )
+            summary = await self.summaries.get(
+                inter.guild.id, user.id, refresh=ADVISORY_LOCKS, session=session
             )
 
-            active_infraction = None
-            for infr in infractions:
-                if infr[0].active:
-                    active_infraction = infr[0]
-                    break
-
-            if active_infraction is None:
+            if (active_infraction := summary.get_active(type_)) is None:
                 await inter.send(
                     f":x: The user {user.mention} does not have an active infraction.",
                     ephemeral=True,
@@ -285,18 +337,14 @@ class Infract(Cog):
                 )
                 return
 
-            dm_sent = None
+            dm_queued = False
 
             # Send a DM to the user
             if active_infraction.type not in HIDDEN_INFRACTIONS:
-                dm_sent = True
-
-                try:
-                    await user.send(
-                        f"Your {INFRACTION_NAME[type_]} in {inter.guild.name} has been cancelled."
-                    )
-                except (HTTPException, Forbidden):
-                    dm_sent = False
+                self.outbox.send(
+                    user, f"Your {INFRACTION_NAME[type_]} in {inter.guild.name} has been cancelled."
+                )
+                dm_queued = True
 
             # Cancel the infraction
             await session.execute(
@@ -305,9 +353,10 @@ class Infract(Cog):
                 .values(cancelled=True)
             )
             await session.commit()
+            active_infraction.cancelled = True
 
             # Send the cancellation message
-            emoji_text = EMOJI_DM_SUCCESS if type_ not in HIDDEN_INFRACTIONS and dm_sent else ""
+            emoji_text = EMOJI_DM_QUEUED if dm_queued else ""
             await inter.send(
                 f"{emoji_text} {EMOJI_CANCELLED} {INFRACTION_NAME[type_].capitalize()} cancelled "
                 f"for {user.mention} (#{active_infraction.id}).",
@@ -325,7 +374,8 @@ class Infract(Cog):
                     f"{INFRACTION_NAME[type_].capitalize()} cancelled",
                     config.colors.success,
                     user,
-                    moderator=f"{moderator.mention} (`{moderator}`, `{moderator.id}`)",
+                    moderator=moderator,
+                    priority=LogPriority.HIGH,
                 )
 
     @require_permission(role_id="moderation.perms.role", permissions="moderation.perms.discord")
@@ -363,6 +413,179 @@ class Infract(Cog):
         """Ban a user."""
         await self.infract(inter, InfractionTypes.BAN, user, inter.author, reason)
 
+    @staticmethod
+    async def _active_ban_ids(
+        session: AsyncSession, guild_id: int, user_ids: Iterable[int]
+    ) -> set[int]:
+        """Return which of the users have an active ban."""
+        rows = await session.execute(
+            select(InfractionModel.user_id).where(
+                and_(
+                    InfractionModel.guild_id == guild_id,
+                    InfractionModel.type == InfractionTypes.BAN,
+                    InfractionModel.cancelled.is_(False),
+                    InfractionModel.user_id.in_(list(user_ids)),
+                )
+            )
+        )
+        return {row[0] for row in rows}
+
+    async def _ban_for_mass_ban(
+        self,
+        guild: Guild,
+        user_id: int,
+        reason: str,
+        semaphore: asyncio.Semaphore,
+        logging_module: Optional[Logging],
+    ) -> bool:
+        """Ban a single user of a mass ban, returning whether it succeeded."""
+        async with semaphore, INFRACTION_LOCKS.acquire((guild.id, user_id)):
+            # A single summary is logged instead of one log per user. The events are ignored
+            # right before each ban, so they don't expire while the previous bans are running
+            if logging_module:
+                logging_module.ignore_event(guild.id, "user_banned", user_id)
+                logging_module.ignore_event(guild.id, "user_left", user_id)
+
+            try:
+                await guild.ban(Object(user_id), reason=reason)
+            except HTTPException as e:
+                logger.debug(f"Couldn't ban {user_id} during a mass ban: {e}")
+                return False
+
+        return True
+
+    @require_permission(role_id="moderation.perms.role", permissions="moderation.perms.discord")
+    @slash_command()
+    async def massban(
+        self,
+        inter: ACI,
+        reason: str,
+        users: Optional[str] = None,
+        joined_within: Optional[str] = None,
+    ) -> None:
+        """Ban many users at once, from a list of IDs or mentions, or from a join window."""
+        if not users and not joined_within:
+            await inter.send(":x: Provide a list of users or a join window.", ephemeral=True)
+            return
+
+        if not inter.guild.me.guild_permissions.ban_members:
+            await inter.send(
+                ":x: The bot doesn't have the permission to apply this infraction.",
+                ephemeral=True,
+            )
+            return
+
+        await inter.response.defer()
+
+        user_ids = {int(id_) for id_ in USER_ID_REGEX.findall(users or "")}
+
+        if joined_within:
+            cutoff = datetime.now(timezone.utc) - convert_relativedelta(joined_within)
+            user_ids.update(
+                member.id
+                for member in inter.guild.members
+                if member.joined_at and member.joined_at >= cutoff
+            )
+
+        # Never ban the moderator, the owner, the bot or members ranked above it
+        user_ids -= {inter.author.id, inter.guild.owner_id, inter.guild.me.id}
+        user_ids = {
+            user_id
+            for user_id in user_ids
+            if not (member := inter.guild.get_member(user_id))
+            or member.top_role < inter.guild.me.top_role
+        }
+
+        if len(user_ids) > MAX_MASS_BAN:
+            await inter.send(f":x: Cannot ban more than {MAX_MASS_BAN} users at once.")
+            return
+
+        config = await self.bot.get_config(inter)
+
+        # Skip the users who are already banned
+        if user_ids:
+            async with self.bot.Session() as session:
+                user_ids -= await self._active_ban_ids(session, inter.guild.id, user_ids)
+
+        if not user_ids:
+            await inter.send(":x: No user to ban.")
+            return
+
+        # The sessions are kept short, no connection is held while the bans are running
+        logging_module: Optional[Logging] = self.bot.get_cog("Logging")
+        semaphore = asyncio.Semaphore(MASS_BAN_CONCURRENCY)
+        ordered_ids = sorted(user_ids)
+        results = await asyncio.gather(
+            *(
+                self._ban_for_mass_ban(inter.guild, user_id, reason, semaphore, logging_module)
+                for user_id in ordered_ids
+            )
+        )
+        banned = [user_id for user_id, success in zip(ordered_ids, results) if success]
+
+        if banned:
+            keys = [(inter.guild.id, user_id) for user_id in banned]
+
+            async with INFRACTION_LOCKS.acquire_many(keys), self.bot.Session() as session:
+                if self.advisory_locks:
+                    await self.advisory_locks.lock(session, *keys)
+
+                # Users banned by another command in the meantime already have their infraction
+                already_banned = await self._active_ban_ids(session, inter.guild.id, banned)
+                recorded = [user_id for user_id in banned if user_id not in already_banned]
+
+                if recorded:
+                    created_at = inter.created_at.replace(tzinfo=None)
+                    await session.execute(
+                        insert(InfractionModel),
+                        [
+                            {
+                                "guild_id": inter.guild.id,
+                                "user_id": user_id,
+                                "moderator_id": inter.author.id,
+                                "type": InfractionTypes.BAN,
+                                "reason": reason,
+                                "created_at": created_at,
+                                "cancelled": False,
+                                "dm_sent": False,
+                            }
+                            for user_id in recorded
+                        ],
+                    )
+                    await record_infractions(
+                        session,
+                        inter.guild.id,
+                        InfractionTypes.BAN,
+                        inter.author.id,
+                        created_at,
+                        recorded,
+                    )
+                    await session.commit()
+
+                for user_id in recorded:
+                    self.summaries.invalidate(inter.guild.id, user_id)
+
+        failed = len(user_ids) - len(banned)
+        failed_text = f", {failed} could not be banned" if failed else ""
+        await inter.send(f"{EMOJI_APPLIED} Banned {len(banned)} users{failed_text}: {reason}")
+
+        # Send a single message to the log channel
+        if banned and config.logging.channels.moderation is not None and logging_module:
+            await logging_module.send_log_message(
+                inter.guild.id,
+                config.logging.channels.moderation,
+                "Mass ban applied",
+                config.colors.warning,
+                moderator=inter.author,
+                priority=LogPriority.HIGH,
+                file=File(BytesIO("\n".join(map(str, banned)).encode()), "banned-users.txt"),
+                reason=reason,
+                banned=str(len(banned)),
+                failed=str(failed),
+            )
+
+    massban.autocomplete("joined_within")(autocomplete_relativedelta)
+
     @require_permission(role_id="moderation.perms.role", permissions="moderation.perms.discord")
     @slash_command()
     async def unmute(self, inter: ACI, user: User) -> None:
@@ -1,17 +1,28 @@
-from typing import AsyncIterator, Literal, Optional
+from collections import Counter
+from datetime import date, datetime, timedelta
+from io import BytesIO
+from typing import AsyncIterator, Iterable, Literal, Optional
 
 from dateutil.relativedelta import relativedelta
-from disnake import Embed, User
+from disnake import Embed, File, User
 from disnake.ext.commands import Cog, slash_command
-from sqlalchemy import and_, select
+from sqlalchemy import and_, desc, func, select
 
 from starbot.bot import StarBot
 from starbot.checks import require_permission
 from starbot.constants import ACI
 from starbot.models.infraction import InfractionModel, InfractionTypes
+from starbot.models.infraction_rollup import InfractionRollupModel, InfractionUserRollupModel
 from starbot.modules.moderation._constants import INFRACTION_NAME
+from starbot.modules.moderation._infraction_export import (
+    ExportFormat,
+    ExportWriter,
+    infraction_to_row,
+)
 from starbot.utils.paginator import PaginatorView
+from starbot.utils.text import truncate
 from starbot.utils.time import format_timestamp, humanized_delta
+from starbot.utils.users import UserResolver
 
 CANCELLABLE_INFRACTIONS = {InfractionTypes.MUTE, InfractionTypes.BAN}
 
@@ -22,6 +33,13 @@ YELLOW_CIRCLE = "\N{LARGE YELLOW CIRCLE}"
 INFRACTION_LITERAL = Literal["note", "warn", "mute", "kick", "ban", "all"]
 
 PAGINATOR_LENGTH = 1200  # Maximum length of a single page of infractions
+RENDER_BATCH_SIZE = 10  # Number of infractions whose users are resolved together
+EXPORT_BATCH_SIZE = 500  # Number of rows fetched at once by the export cursor
+
+MAX_STATS_DAYS = 365
+STATS_TOP_SIZE = 5  # Number of moderators and offenders listed by the stats
+REPEAT_OFFENDER_THRESHOLD = 2
+EMBED_FIELD_LIMIT = 1024
 
 
 class Infractions(Cog):
@@ -29,14 +47,22 @@ class Infractions(Cog):
 
     def __init__(self, bot: StarBot) -> None:
         self.bot = bot
+        self.users = UserResolver(bot)
 
-    def try_format_user(self, user_id: int) -> str:
+    def try_format_user(
+        self, user_id: int, users: Optional[dict[int, Optional[User]]] = None
+    ) -> str:
         """Try to format a user ID by resolving it, if possible."""
-        if user := self.bot.get_user(user_id):
+        if user := (users or {}).get(user_id) or self.bot.get_user(user_id):
             return f"{user.mention} (`{user}`, `{user.id}`)"
         return f"<@{user_id}> (`{user_id}`)"
 
-    def format_infraction(self, infr: InfractionModel, include_id: bool = True) -> str:
+    def format_infraction(
+        self,
+        infr: InfractionModel,
+        include_id: bool = True,
+        users: Optional[dict[int, Optional[User]]] = None,
+    ) -> str:
         """Format an infraction into a nice human readable string."""
         if infr.type in CANCELLABLE_INFRACTIONS:
             emoji = GREEN_CIRCLE if infr.active else RED_CIRCLE
@@ -56,14 +82,38 @@ class Infractions(Cog):
         return (
             f"{emoji} **{INFRACTION_NAME[infr.type].capitalize()}**{id_text}\n"
             f"**Reason**: {infr.reason}\n"
-            f"**User**: {self.try_format_user(infr.user_id)}\n"
-            f"**Moderator**: {self.try_format_user(infr.moderator_id)}\n"
+            f"**User**: {self.try_format_user(infr.user_id, users)}\n"
+            f"**Moderator**: {self.try_format_user(infr.moderator_id, users)}\n"
             f"**Created at**: {format_timestamp(infr.created_at)}\n"
             f"{duration_text}"
             f"**DM sent**: {infr.dm_sent}"
             f"{cancelled_text}"
         )
 
+    async def format_infractions(self, infractions: Iterable[InfractionModel]) -> list[str]:
+        """Format the infractions, resolving all of their users at once."""
+        users = await self.users.resolve(
+            user_id for infr in infractions for user_id in (infr.user_id, infr.moderator_id)
+        )
+        return [self.format_infraction(infr, users=users) for infr in infractions]
+
+    async def render_infractions(
+        self, infractions: AsyncIterator[InfractionModel]
+    ) -> AsyncIterator[str]:
+        """Format the infractions lazily, in batches sharing a single user resolution."""
+        batch = []
+
+        async for infraction in infractions:
+            batch.append(infraction)
+
+            if len(batch) == RENDER_BATCH_SIZE:
+                for text in await self.format_infractions(batch):
+                    yield text
+                batch = []
+
+        for text in await self.format_infractions(batch):
+            yield text
+
     @require_permission(role_id="moderation.perms.role", permissions="moderation.perms.discord")
     @slash_command()
     async def infraction(self, inter: ACI) -> None:
@@ -94,10 +144,12 @@ class Infractions(Cog):
                 )
                 return
 
+            users = await self.users.resolve((infraction.user_id, infraction.moderator_id))
+
             await inter.send(
                 embed=Embed(
                     title=f"Infraction {id}",
-                    description=self.format_infraction(infraction, False),
+                    description=self.format_infraction(infraction, False, users),
                     color=config.colors.info,
                 )
             )
@@ -117,6 +169,19 @@ class Infractions(Cog):
 
         await inter.response.defer()
 
+        # Looking up the infractions of a user is served from the summaries when possible
+        if user and not reason and (infract := self.bot.get_cog("Infract")):
+            summary = await infract.summaries.get(inter.guild.id, user.id)
+
+            if summary.complete:
+                infractions = [
+                    infraction
+                    for infraction in summary.latest
+                    if type == "all" or infraction.type == InfractionTypes[type.upper()]
+                ]
+                await self._send_search_results(inter, infractions)
+                return
+
         predicates = [InfractionModel.guild_id == inter.guild.id]
 
         if user:
@@ -138,22 +203,171 @@ class Infractions(Cog):
                 await inter.send(":x: No infractions found.", ephemeral=True)
                 return
 
-            async def _infraction_stream() -> AsyncIterator[str]:
-                yield self.format_infraction(first_infraction[0])
+            async def _infraction_stream() -> AsyncIterator[InfractionModel]:
+                yield first_infraction[0]
                 async for infraction in query:
-                    yield self.format_infraction(infraction[0])
+                    yield infraction[0]
 
             config = await self.bot.get_config(inter)
 
             paginator = PaginatorView(
                 inter=inter,
-                gen=_infraction_stream(),
+                gen=self.render_infractions(_infraction_stream()),
                 title="Search results",
                 color=config.colors.info,
                 max_len=PAGINATOR_LENGTH,
             )
             await paginator.start()
 
+    @infraction.sub_command()
+    async def export(self, inter: ACI, format: ExportFormat = "csv") -> None:
+        """Export all the infractions of this server as compressed files."""
+        await inter.response.defer()
+
+        writer = ExportWriter(format, inter.guild.filesize_limit)
+
+        async def _send_part(part: BytesIO) -> None:
+            await inter.send(
+                f"Part {writer.parts}",
+                file=File(part, f"infractions-{inter.guild.id}-{writer.parts}.{format}.gz"),
+            )
+
+        async with self.bot.Session() as session:
+            # Rows are streamed from a server-side cursor, a batch at a time
+            rows = await session.stream(
+                select(InfractionModel)
+                .where(InfractionModel.guild_id == inter.guild.id)
+                .order_by(InfractionModel.id)
+                .execution_options(yield_per=EXPORT_BATCH_SIZE)
+            )
+
+            async for infraction in rows:
+                if full_part := writer.write(infraction_to_row(infraction[0])):
+                    await _send_part(full_part)
+
+        if not writer.rows:
+            await inter.send(":x: No infractions found.", ephemeral=True)
+            return
+
+        await _send_part(writer.finish())
+        await inter.send(f"Exported {writer.rows} infractions in {writer.parts} part(s).")
+
+    @infraction.sub_command()
+    async def stats(self, inter: ACI, days: int = 30) -> None:
+        """Show the infraction trends of this server over the last days."""
+        await inter.response.defer()
+
+        days = max(1, min(days, MAX_STATS_DAYS))
+        since = (datetime.utcnow() - timedelta(days=days - 1)).date()
+        rollup_filter = and_(
+            InfractionRollupModel.guild_id == inter.guild.id, InfractionRollupModel.day >= since
+        )
+        total = func.sum(InfractionRollupModel.count)
+
+        # Everything is read from the rollups, never from the infraction table
+        async with self.bot.Session() as session:
+            daily = await session.execute(
+                select(InfractionRollupModel.day, InfractionRollupModel.type, total)
+                .where(rollup_filter)
+                .group_by(InfractionRollupModel.day, InfractionRollupModel.type)
+                .order_by(desc(InfractionRollupModel.day))
+            )
+            moderators = await session.execute(
+                select(InfractionRollupModel.moderator_id, total)
+                .where(rollup_filter)
+                .group_by(InfractionRollupModel.moderator_id)
+                .order_by(desc(total))
+                .limit(STATS_TOP_SIZE)
+            )
+
+            # User rollups aren't split by day, so offenders active within the window are
+            # listed with their all-time totals
+            user_total = func.sum(InfractionUserRollupModel.count)
+            offenders = await session.execute(
+                select(InfractionUserRollupModel.user_id, user_total)
+                .where(
+                    and_(
+                        InfractionUserRollupModel.guild_id == inter.guild.id,
+                        InfractionUserRollupModel.type != InfractionTypes.NOTE,
+                        InfractionUserRollupModel.last_at >= since,
+                    )
+                )
+                .group_by(InfractionUserRollupModel.user_id)
+                .having(user_total >= REPEAT_OFFENDER_THRESHOLD)
+                .order_by(desc(user_total))
+                .limit(STATS_TOP_SIZE)
+            )
+
+        daily, moderators, offenders = daily.all(), moderators.all(), offenders.all()
+
+        if not daily:
+            await inter.send(f":x: No infractions in the last {days} days.", ephemeral=True)
+            return
+
+        totals: Counter[InfractionTypes] = Counter()
+        days_text: dict[date, list[str]] = {}
+
+        for day, type_, count in daily:
+            totals[type_] += count
+            days_text.setdefault(day, []).append(f"{INFRACTION_NAME[type_]} {count}")
+
+        users = await self.users.resolve(
+            [row[0] for row in moderators] + [row[0] for row in offenders]
+        )
+
+        config = await self.bot.get_config(inter)
+        embed = Embed(title=f"Infractions of the last {days} days", color=config.colors.info)
+
+        embed.add_field(
+            "Totals",
+            "\n".join(
+                f"**{INFRACTION_NAME[type_].capitalize()}**: {count}"
+                for type_, count in totals.most_common()
+            ),
+        )
+        embed.add_field(
+            "Top moderators",
+            "\n".join(f"{self.try_format_user(id_, users)}: {count}" for id_, count in moderators),
+            inline=False,
+        )
+        embed.add_field(
+            "Repeat offenders (all-time totals)",
+            "\n".join(f"{self.try_format_user(id_, users)}: {count}" for id_, count in offenders)
+            or "None",
+            inline=False,
+        )
+        embed.add_field(
+            "Daily",
+            truncate(
+                "\n".join(f"`{day}`: {', '.join(text)}" for day, text in days_text.items()),
+                EMBED_FIELD_LIMIT,
+            ),
+            inline=False,
+        )
+
+        await inter.send(embed=embed)
+
+    async def _send_search_results(self, inter: ACI, infractions: list[InfractionModel]) -> None:
+        """Paginate already loaded search results."""
+        if not infractions:
+            await inter.send(":x: No infractions found.", ephemeral=True)
+            return
+
+        async def _infraction_stream() -> AsyncIterator[InfractionModel]:
+            for infraction in infractions:
+                yield infraction
+
+        config = await self.bot.get_config(inter)
+
+        paginator = PaginatorView(
+            inter=inter,
+            gen=self.render_infractions(_infraction_stream()),
+            title="Search results",
+            color=config.colors.info,
+            max_len=PAGINATOR_LENGTH,
+        )
+        await paginator.start()
+
 
 def setup(bot: StarBot) -> None:
     """Loads the infractions module."""
@@ -0,0 +1,241 @@
+import asyncio
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from disnake import File, HTTPException, Message, NotFound, TextChannel, Thread, User
+from disnake.ext.commands import Cog, slash_command
+
+from starbot.bot import StarBot
+from starbot.checks import require_permission
+from starbot.constants import ACI, BULK_DELETE_LIMIT
+from starbot.converters import autocomplete_relativedelta, convert_relativedelta
+from starbot.modules.moderation._transcript import (
+    MAX_TRANSCRIPT_SIZE,
+    TranscriptLine,
+    build_transcript,
+)
+from starbot.modules.moderation.discord_logging import Logging
+
+# Discord refuses to bulk delete older messages, keep a margin for the time spent purging
+BULK_DELETE_MAX_AGE = timedelta(days=14) - timedelta(minutes=5)
+
+MAX_PURGE = 1000
+# Number of messages looked at before giving up, whatever the number of matches
+MAX_SCANNED = 10_000
+
+LINK_REGEX = re.compile(r"(?i)\bhttps?://\S+")
+# Moderator supplied patterns are bounded, and matched off the event loop with a time limit
+MAX_REGEX_LENGTH = 200
+REGEX_TIMEOUT = 1
+
+logger = logging.getLogger(__name__)
+
+
+class _PurgeFilter:
+    """Match the messages to purge."""
+
+    def __init__(
+        self,
+        user: Optional[User],
+        contains: Optional[str],
+        regex: Optional[re.Pattern],
+        has_links: bool,
+    ) -> None:
+        self.user = user
+        self.contains = contains.casefold() if contains else None
+        self.regex = regex
+        self.has_links = has_links
+
+    def _matches_fields(self, message: Message) -> bool:
+        if message.pinned:
+            return False
+        if self.user and message.author.id != self.user.id:
+            return False
+        if self.contains and self.contains not in message.content.casefold():
+            return False
+        if self.has_links and not LINK_REGEX.search(message.content):
+            return False
+        return True
+
+    async def __call__(self, message: Message) -> bool:
+        """Return whether the message matches, raising `asyncio.TimeoutError` if the regex hangs."""
+        if not self._matches_fields(message):
+            return False
+        if not self.regex:
+            return True
+
+        # A pattern backtracking catastrophically would otherwise block the whole bot
+        match = await asyncio.wait_for(
+            asyncio.to_thread(self.regex.search, message.content), REGEX_TIMEOUT
+        )
+        return match is not None
+
+
+class Purge(Cog):
+    """Delete many messages of a channel at once."""
+
+    def __init__(self, bot: StarBot) -> None:
+        self.bot = bot
+
+    async def delete_batch(
+        self, channel: TextChannel | Thread, messages: list[Message]
+    ) -> list[Message]:
+        """
+        Delete a batch of messages, returning the ones that were deleted.
+
+        Recent messages are bulk deleted, older ones are deleted one by one.
+        """
+        if logging_module := self.bot.get_cog("Logging"):
+            logging_module.ignore_messages(channel.guild.id, (message.id for message in messages))
+
+        bulk_cutoff = datetime.now(timezone.utc) - BULK_DELETE_MAX_AGE
+        recent = [message for message in messages if message.created_at > bulk_cutoff]
+        old = [message for message in messages if message.created_at <= bulk_cutoff]
+
+        deleted = []
+
+        if recent:
+            try:
+                await channel.delete_messages(recent)
+                deleted += recent
+            except HTTPException as e:
+                logger.debug(f"Failed to bulk delete {len(recent)} messages in {channel}: {e}")
+
+        # Slow path, each request is subject to the rate limits
+        for message in old:
+            try:
+                await message.delete()
+                deleted.append(message)
+            except NotFound:
+                pass
+            except HTTPException as e:
+                logger.debug(f"Failed to delete message {message.id} in {channel}: {e}")
+
+        return deleted
+
+    @require_permission(role_id="moderation.perms.role", permissions="moderation.perms.discord")
+    @slash_command()
+    async def purge(
+        self,
+        inter: ACI,
+        count: int = 100,
+        user: Optional[User] = None,
+        contains: Optional[str] = None,
+        regex: Optional[str] = None,
+        has_links: bool = False,
+        max_age: Optional[str] = None,
+    ) -> None:
+        """Delete the latest messages of this channel, up to `count`, matching every filter."""
+        if not 1 <= count <= MAX_PURGE:
+            await inter.send(f":x: Can only purge 1 to {MAX_PURGE} messages.", ephemeral=True)
+            return
+
+        permissions = inter.channel.permissions_for(inter.guild.me)
+        if not permissions.manage_messages or not permissions.read_message_history:
+            await inter.send(
+                ":x: The bot doesn't have the permission to delete messages in this channel.",
+                ephemeral=True,
+            )
+            return
+
+        if regex and len(regex) > MAX_REGEX_LENGTH:
+            await inter.send(
+                f":x: Regular expressions are limited to {MAX_REGEX_LENGTH} characters.",
+                ephemeral=True,
+            )
+            return
+
+        try:
+            pattern = re.compile(regex) if regex else None
+        except re.error as e:
+            await inter.send(f":x: Invalid regular expression: {e}.", ephemeral=True)
+            return
+
+        after = datetime.now(timezone.utc) - convert_relativedelta(max_age) if max_age else None
+        matches = _PurgeFilter(user, contains, pattern, has_links)
+
+        await inter.response.defer(ephemeral=True)
+
+        batch: list[Message] = []
+        # Only the messages actually deleted make it to the transcript
+        lines: list[TranscriptLine] = []
+        scanned = matched = 0
+        timed_out = False
+
+        async for message in inter.channel.history(
+            limit=MAX_SCANNED, before=inter.created_at, after=after, oldest_first=False
+        ):
+            scanned += 1
+            try:
+                if not await matches(message):
+                    continue
+            except asyncio.TimeoutError:
+                timed_out = True
+                break
+
+            batch.append(message)
+            matched += 1
+
+            if len(batch) == BULK_DELETE_LIMIT:
+                lines += _transcript_lines(await self.delete_batch(inter.channel, batch))
+                batch = []
+
+            if matched >= count:
+                break
+
+        if batch:
+            lines += _transcript_lines(await self.delete_batch(inter.channel, batch))
+
+        deleted = len(lines)
+        failed = matched - deleted
+        failed_text = f", {failed} could not be deleted" if failed else ""
+        timed_out_text = (
+            " Stopped early, the regular expression took too long to match." if timed_out else ""
+        )
+        await inter.send(
+            f":white_check_mark: Purged {deleted} messages out of {scanned} scanned{failed_text}."
+            + timed_out_text,
+            ephemeral=True,
+        )
+
+        # Send a single message to the log channel
+        config = await self.bot.get_config(inter)
+        logging_module: Optional[Logging] = self.bot.get_cog("Logging")
+
+        if deleted and config.logging.channels.messages and logging_module:
+            transcript = build_transcript(
+                lines, min(MAX_TRANSCRIPT_SIZE, inter.guild.filesize_limit)
+            )
+
+            await logging_module.send_log_message(
+                inter.guild.id,
+                config.logging.channels.messages,
+                "Messages purged",
+                config.colors.warning,
+                moderator=inter.author,
+                file=File(transcript, f"purged-messages-{inter.channel.id}.txt"),
+                channel=f"{inter.channel.mention} (`{inter.channel}`, `{inter.channel.id}`)",
+                messages=str(deleted),
+                failed=str(failed),
+            )
+
+    purge.autocomplete("max_age")(autocomplete_relativedelta)
+
+
+def _transcript_lines(messages: list[Message]) -> list[TranscriptLine]:
+    return [
+        TranscriptLine(
+            message.id,
+            f"{message.author} ({message.author.id})",
+            message.content,
+            len(message.attachments),
+        )
+        for message in messages
+    ]
+
+
+def setup(bot: StarBot) -> None:
+    """Loads the Purge cog."""
+    bot.add_cog(Purge(bot))
@@ -1,9 +1,10 @@
 from contextlib import suppress
 
-from disnake import HTTPException, Member, Object
+from disnake import HTTPException, Object
 from disnake.ext.commands import Cog
 
 from starbot.bot import StarBot
+from starbot.modules.internals.member_updates import MemberUpdate
 
 
 class AutoRole(Cog):
@@ -12,17 +13,16 @@ class AutoRole(Cog):
     def __init__(self, bot: StarBot) -> None:
         self.bot = bot
 
-    @Cog.listener("on_member_update")
-    async def assign_role(self, before: Member, after: Member) -> None:
+    @Cog.listener("on_member_verified")
+    async def assign_role(self, update: MemberUpdate) -> None:
         """Assign the role if a member passes verification."""
-        if before.pending is False or after.pending is True:
+        anti_raid = self.bot.get_cog("AntiRaid")
+        if anti_raid and anti_raid.is_auto_role_paused(update.after.guild.id, update.config):
             return
 
-        config = await self.bot.get_config(guild_id=before.guild.id)
-
-        if config.utilities.auto_role:
+        if update.config.utilities.auto_role:
             with suppress(HTTPException):
-                await after.add_roles(Object(config.utilities.auto_role))
+                await update.after.add_roles(Object(update.config.utilities.auto_role))
 
 
 def setup(bot: StarBot) -> None:
@@ -0,0 +1,62 @@
+import time
+from collections import OrderedDict
+from typing import Generic, Hashable, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+_MISSING = object()
+
+
+class LRUCache(Generic[K, V]):
+    """
+    Mapping bounded to `maxsize` entries, evicting the least recently used ones first.
+
+    If `ttl` is set, entries also expire after that many seconds.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: K) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        """Return the value of that key if it is cached and didn't expire, `default` otherwise."""
+        if (entry := self._entries.get(key)) is None:
+            return default
+
+        expires_at, value = entry
+
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return default
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V, ttl: Optional[float] = None) -> None:
+        """Cache a value, overriding the default time to live if `ttl` is set."""
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else float("inf")
+
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        """Remove a key from the cache, returning its value if it was cached."""
+        value = self.get(key, default)
+        self._entries.pop(key, None)
+        return value
+
+    def clear(self) -> None:
+        """Remove every entry from the cache."""
+        self._entries.clear()
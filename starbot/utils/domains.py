@@ -0,0 +1,102 @@
+import re
+from typing import Collection, Iterator, Optional
+
+# Domain regex
+DOMAIN_REGEX = re.compile(r"(?i)\b((?:[a-z0-9][-a-z0-9]*[a-z0-9]\.)+[a-z][-a-z0-9]{0,22}[a-z0])")
+
+# Characters, other than alphanumerics, that can be part of the same word as a domain
+_WORD_PUNCTUATION = "_.-"
+
+
+def _with_parents(domain: str) -> Iterator[str]:
+    """Yield the domain, then each of its parents with at least two labels."""
+    yield domain
+
+    while (dot := domain.find(".")) != -1 and "." in (domain := domain[dot + 1 :]):
+        yield domain
+
+
+def find_domain(text: str, domains: Collection[str]) -> Optional[str]:
+    """Return the first domain of the text found in `domains`, or whose parent is, if any."""
+    for match in DOMAIN_REGEX.finditer(text):
+        for domain in _with_parents(match.group(0).lower()):
+            if domain in domains:
+                return domain
+    return None
+
+
+class DomainMatcher:
+    """
+    Match the domains of a text against a global set layered with per-guild overlays.
+
+    An overlay maps a domain to True if the guild blocks it, or False if the guild allows it,
+    and takes precedence over the global set. Blocked and allowed domains share the same
+    overlay, so the text is scanned once whatever the number of lists.
+
+    Listing a domain also covers its subdomains, the most specific entry taking precedence.
+    """
+
+    def __init__(self, domains: Collection[str]) -> None:
+        self.domains = domains
+        self.overlays: dict[int, dict[str, bool]] = {}
+
+    def set_domain(self, guild_id: int, domain: str, blocked: bool) -> None:
+        """Block or allow a domain in that guild."""
+        self.overlays.setdefault(guild_id, {})[domain] = blocked
+
+    def remove_domain(self, guild_id: int, domain: str) -> None:
+        """Remove a domain from the overlay of that guild."""
+        if overlay := self.overlays.get(guild_id):
+            overlay.pop(domain, None)
+
+            if not overlay:
+                del self.overlays[guild_id]
+
+    def find(self, text: str, guild_id: Optional[int] = None) -> Optional[str]:
+        """Return the first domain of the text blocked in that guild, if any."""
+        if not (overlay := self.overlays.get(guild_id)):
+            return find_domain(text, self.domains)
+
+        for match in DOMAIN_REGEX.finditer(text):
+            for domain in _with_parents(match.group(0).lower()):
+                if (blocked := overlay.get(domain)) is None:
+                    if domain not in self.domains:
+                        continue
+                    blocked = True
+
+                if blocked:
+                    return domain
+                # Allowed by the guild, whatever the lists say about its parents
+                break
+        return None
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char in _WORD_PUNCTUATION
+
+
+def changed_span(before: str, after: str) -> str:
+    """
+    Return the part of `after` which could contain domains that weren't in `before`.
+
+    The span between the common prefix and suffix is widened to the surrounding words,
+    so a domain partly introduced by the edit is still fully contained in it.
+    """
+    max_common = min(len(before), len(after))
+
+    prefix = 0
+    while prefix < max_common and before[prefix] == after[prefix]:
+        prefix += 1
+
+    suffix = 0
+    while suffix < max_common - prefix and before[-suffix - 1] == after[-suffix - 1]:
+        suffix += 1
+
+    start, end = prefix, len(after) - suffix
+
+    while start > 0 and _is_word_char(after[start - 1]):
+        start -= 1
+    while end < len(after) and _is_word_char(after[end]):
+        end += 1
+
+    return after[start:end]
@@ -0,0 +1,191 @@
+import asyncio
+import gzip
+import json
+import logging
+from datetime import date, datetime, timedelta, timezone
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from starbot.constants import COMPRESSION_MARGIN
+
+# Seconds during which events are buffered before being written to disk
+FLUSH_INTERVAL = 5
+FILE_PATTERN = "events-{date}.jsonl.gz"
+FILE_GLOB = "events-*.jsonl.gz"
+# Number of days of files kept by default
+RETENTION = 30
+
+logger = logging.getLogger(__name__)
+
+
+class EventSink:
+    """
+    Write events as JSON lines into compressed files, one file per day (UTC).
+
+    Events are buffered in memory and written from a thread, so the event loop never
+    waits for the disk. Each flush appends a new gzip member to the file of the day,
+    which is still read as a single stream.
+
+    Files older than `retention` days are deleted when the sink moves on to a new file.
+    """
+
+    def __init__(
+        self, directory: Path, retention: int = RETENTION, interval: float = FLUSH_INTERVAL
+    ) -> None:
+        self.directory = directory
+        self.retention = retention
+        self.interval = interval
+        # Day of the latest file written to, to notice when a new one is started
+        self.current_day: Optional[date] = None
+
+        self.buffer: list[tuple[date, str]] = []
+        self.lock = asyncio.Lock()
+        self.task: Optional[asyncio.Task] = None
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def record(
+        self, event: str, guild_id: int, user_id: Optional[int], fields: dict[str, Any]
+    ) -> None:
+        """Buffer an event, to be written on the next flush."""
+        now = datetime.now(timezone.utc)
+        line = json.dumps(
+            {
+                "timestamp": now.isoformat(),
+                "event": event,
+                "guild_id": guild_id,
+                "user_id": user_id,
+                "fields": fields,
+            },
+            default=str,
+        )
+        self.buffer.append((now.date(), line))
+
+        if self.task is None:
+            self.task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        try:
+            await asyncio.sleep(self.interval)
+
+            while self.buffer:
+                await self.flush()
+        finally:
+            self.task = None
+
+    async def flush(self) -> None:
+        """Write the buffered events to disk."""
+        async with self.lock:
+            lines, self.buffer = self.buffer, []
+
+            if lines:
+                try:
+                    await asyncio.to_thread(self._write, lines)
+                except OSError:
+                    logger.exception(f"Couldn't write {len(lines)} events to disk.")
+
+    def _write(self, lines: list[tuple[date, str]]) -> None:
+        by_day: dict[date, list[str]] = {}
+
+        for day, line in lines:
+            by_day.setdefault(day, []).append(line)
+
+        for day, day_lines in by_day.items():
+            path = self.directory / FILE_PATTERN.format(date=day.isoformat())
+            with gzip.open(path, "at") as file:
+                file.write("\n".join(day_lines) + "\n")
+
+        if self.current_day is None or max(by_day) > self.current_day:
+            self.current_day = max(by_day)
+            self._prune(self.current_day)
+
+    def _prune(self, today: date) -> None:
+        """Delete the files of the days before the retention period."""
+        cutoff = today - timedelta(days=self.retention)
+
+        for path in self.directory.glob(FILE_GLOB):
+            try:
+                day = date.fromisoformat(path.name.removeprefix("events-").split(".")[0])
+            except ValueError:
+                continue
+
+            if day <= cutoff:
+                logger.info(f"Deleting expired event file {path.name}.")
+                path.unlink(missing_ok=True)
+
+    async def close(self) -> None:
+        """Stop the background flush and write everything still buffered."""
+        if self.task is not None:
+            self.task.cancel()
+
+        await self.flush()
+
+    async def export(
+        self,
+        days: int,
+        max_size: int,
+        guild_id: Optional[int] = None,
+        event: Optional[str] = None,
+        user_id: Optional[int] = None,
+    ) -> tuple[BytesIO, int, bool]:
+        """
+        Export the matching events of the last `days` days into a compressed JSONL file.
+
+        Returns the file, the number of exported events,
+        and whether the export was truncated to stay under `max_size` bytes.
+        """
+        await self.flush()
+        return await asyncio.to_thread(self._export, days, max_size, guild_id, event, user_id)
+
+    def _matching_lines(
+        self,
+        days: int,
+        guild_id: Optional[int],
+        event: Optional[str],
+        user_id: Optional[int],
+    ) -> Iterator[str]:
+        today = datetime.now(timezone.utc).date()
+
+        for offset in range(days - 1, -1, -1):
+            day = today - timedelta(days=offset)
+            path = self.directory / FILE_PATTERN.format(date=day.isoformat())
+
+            if not path.exists():
+                continue
+
+            # Stream the file line by line rather than loading whole days in memory
+            with gzip.open(path, "rt") as file:
+                for line in file:
+                    entry = json.loads(line)
+
+                    if (
+                        (guild_id is None or entry["guild_id"] == guild_id)
+                        and (event is None or entry["event"] == event)
+                        and (user_id is None or entry["user_id"] == user_id)
+                    ):
+                        yield line
+
+    def _export(
+        self,
+        days: int,
+        max_size: int,
+        guild_id: Optional[int],
+        event: Optional[str],
+        user_id: Optional[int],
+    ) -> tuple[BytesIO, int, bool]:
+        buffer = BytesIO()
+        count = 0
+        truncated = False
+
+        with gzip.open(buffer, "wt") as output:
+            for line in self._matching_lines(days, guild_id, event, user_id):
+                if buffer.tell() + len(line) > max_size - COMPRESSION_MARGIN:
+                    truncated = True
+                    break
+
+                output.write(line)
+                count += 1
+
+        buffer.seek(0)
+        return buffer, count, truncated
@@ -1,26 +1,139 @@
 import asyncio
 import functools
+import inspect
+import time
+import zlib
+from contextlib import asynccontextmanager
 from types import FunctionType
-from typing import Callable
-from weakref import WeakValueDictionary
+from typing import AsyncIterator, Callable, Hashable, Iterable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 
 Decorator = Callable[[FunctionType], FunctionType]
 
+# Number of locks shared by all the keys, a power of two to spread the hashes evenly
+DEFAULT_STRIPES = 256
+
+
+class AdvisoryLocks:
+    """
+    Lock keys across processes with Postgres transaction advisory locks.
+
+    Locks are taken on the connection of the session and released when its transaction ends,
+    so locking never checks out a connection of its own.
+    """
+
+    def __init__(self, namespace: int) -> None:
+        self.namespace = namespace
+
+    @staticmethod
+    def _key_to_int(key: Hashable) -> int:
+        """Hash the key to a signed 32 bits integer, stable across processes unlike `hash`."""
+        value = zlib.crc32(repr(key).encode())
+        return value - 2 ** 32 if value >= 2 ** 31 else value
+
+    async def lock(self, session: AsyncSession, *keys: Hashable) -> None:
+        """Lock the keys until the end of the current transaction of the session."""
+        # Always lock in the same order, so sessions locking several keys can't deadlock
+        for value in sorted({self._key_to_int(key) for key in keys}):
+            await session.execute(
+                text("SELECT pg_advisory_xact_lock(:namespace, :key)"),
+                {"namespace": self.namespace, "key": value},
+            )
+
+
+class KeyedLock:
+    """
+    Lock any hashable key, such as `(guild_id, user_id)`.
+
+    Keys are spread over a fixed table of preallocated locks, so locking never allocates.
+    Two keys may share the same stripe and wait on each other, which is rare enough
+    with enough stripes. Keys are only locked within the process, see `AdvisoryLocks`.
+    """
+
+    def __init__(self, stripes: int = DEFAULT_STRIPES) -> None:
+        self.locks = tuple(asyncio.Lock() for _ in range(stripes))
+
+        # Contention metrics
+        self.acquisitions = 0
+        self.contended = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def _acquire_stripe(self, lock: asyncio.Lock) -> None:
+        self.acquisitions += 1
+
+        if lock.locked():
+            self.contended += 1
+            start = time.monotonic()
+
+            await lock.acquire()
+
+            waited = time.monotonic() - start
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+        else:
+            await lock.acquire()
+
+    @asynccontextmanager
+    async def acquire(self, key: Hashable) -> AsyncIterator[None]:
+        """Hold the lock of that key."""
+        lock = self.locks[hash(key) % len(self.locks)]
+        await self._acquire_stripe(lock)
+
+        try:
+            yield
+        finally:
+            lock.release()
+
+    @asynccontextmanager
+    async def acquire_many(self, keys: Iterable[Hashable]) -> AsyncIterator[None]:
+        """
+        Hold the locks of all the keys.
+
+        Their stripes are locked in a fixed order, so holders of several keys can't deadlock.
+        """
+        stripes = sorted({hash(key) % len(self.locks) for key in keys})
+        acquired = []
+
+        try:
+            for stripe in stripes:
+                await self._acquire_stripe(self.locks[stripe])
+                acquired.append(self.locks[stripe])
+
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+
+    def metrics(self) -> dict[str, float]:
+        """Return the contention metrics, waits being in seconds."""
+        return {
+            "acquisitions": self.acquisitions,
+            "contended": self.contended,
+            "average_wait": self.total_wait / self.contended if self.contended else 0.0,
+            "max_wait": self.max_wait,
+        }
+
+    def locked(self, key: Callable[..., Hashable]) -> Decorator:
+        """
+        Decorator locking the function on the key computed from its arguments.
 
-def argument_lock(arg_index: int) -> Decorator:
-    """Decorator locking the function to the given argument index."""
+        The key function receives the arguments of the function it needs, by name.
+        """
 
-    def decorator(func: FunctionType) -> FunctionType:
-        __locks = WeakValueDictionary()
+        def decorator(func: FunctionType) -> FunctionType:
+            signature = inspect.signature(func)
+            key_params = tuple(inspect.signature(key).parameters)
 
-        @functools.wraps(func)
-        async def wrapper(*args, **kwargs) -> None:
-            __lock_key = args[arg_index]
-            __lock = __locks.setdefault(__lock_key, asyncio.Lock())
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs) -> None:
+                arguments = signature.bind(*args, **kwargs).arguments
 
-            async with __lock:
-                return await func(*args, **kwargs)
+                async with self.acquire(key(*(arguments[name] for name in key_params))):
+                    return await func(*args, **kwargs)
 
-        return wrapper
+            return wrapper
 
-    return decorator
+        return decorator
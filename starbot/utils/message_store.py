@@ -0,0 +1,164 @@
+import sys
+import zlib
+from collections import OrderedDict, deque
+from heapq import heapify, heappop, heappush
+from typing import Optional
+
+# Estimated memory used by a record besides its content: the object, its IDs and the dict entry
+RECORD_OVERHEAD = 256
+# Number of most recent messages per guild kept uncompressed
+HOT_ENTRIES = 100
+# Contents shorter than this aren't worth compressing
+COMPRESS_MIN_LENGTH = 128
+# Once over budget, messages are evicted until the store is down to this fraction of it,
+# so evictions happen in batches rather than on every new message
+LOW_WATER_MARK = 0.9
+
+
+class StoredMessage:
+    """The parts of a message needed to log its edition or deletion."""
+
+    __slots__ = ("id", "channel_id", "author_id", "attachments", "_content")
+
+    def __init__(
+        self, id_: int, channel_id: int, author_id: int, content: str, attachments: int
+    ) -> None:
+        self.id = id_
+        self.channel_id = channel_id
+        self.author_id = author_id
+        self.attachments = attachments
+        self._content: str | bytes = content
+
+    @property
+    def content(self) -> str:
+        """The content of the message, decompressed if needed."""
+        if isinstance(self._content, bytes):
+            return zlib.decompress(self._content).decode()
+        return self._content
+
+    @content.setter
+    def content(self, content: str) -> None:
+        self._content = content
+
+    @property
+    def size(self) -> int:
+        """Estimated memory used by the record, in bytes."""
+        return RECORD_OVERHEAD + sys.getsizeof(self._content)
+
+    def compress(self) -> None:
+        """Compress the content if that saves memory."""
+        if isinstance(self._content, str) and len(self._content) >= COMPRESS_MIN_LENGTH:
+            compressed = zlib.compress(self._content.encode())
+
+            if sys.getsizeof(compressed) < sys.getsizeof(self._content):
+                self._content = compressed
+
+
+class MessageStore:
+    """
+    Store the recent messages of each guild within a memory budget, in bytes.
+
+    The most recent messages of a guild are kept as is, older ones are compressed.
+    When over budget, the oldest messages of the guild using the most memory are evicted first,
+    so a busy guild cannot push the messages of quieter guilds out.
+    """
+
+    def __init__(self, budget: int) -> None:
+        self.budget = budget
+        self.size = 0
+
+        self.guilds: dict[int, OrderedDict[int, StoredMessage]] = {}
+        self.guild_sizes: dict[int, int] = {}
+        self.hot: dict[int, deque[int]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(messages) for messages in self.guilds.values())
+
+    def add(
+        self,
+        guild_id: int,
+        message_id: int,
+        channel_id: int,
+        author_id: int,
+        content: str,
+        attachments: int,
+    ) -> None:
+        """Store a new message."""
+        self.pop(guild_id, message_id)
+
+        messages = self.guilds.setdefault(guild_id, OrderedDict())
+        hot = self.hot.setdefault(guild_id, deque(maxlen=HOT_ENTRIES))
+
+        record = StoredMessage(message_id, channel_id, author_id, content, attachments)
+        messages[message_id] = record
+        self._resize(guild_id, record.size)
+
+        # The oldest hot message is about to leave the window, compress it
+        if len(hot) == hot.maxlen and (old := messages.get(hot[0])):
+            self._resize(guild_id, -old.size)
+            old.compress()
+            self._resize(guild_id, old.size)
+        hot.append(message_id)
+
+        self._evict()
+
+    def get(self, guild_id: int, message_id: int) -> Optional[StoredMessage]:
+        """Return the stored message, if any."""
+        if messages := self.guilds.get(guild_id):
+            return messages.get(message_id)
+        return None
+
+    def update(self, guild_id: int, message_id: int, content: str) -> None:
+        """Update the content of a stored message after an edit."""
+        if record := self.get(guild_id, message_id):
+            self._resize(guild_id, -record.size)
+            record.content = content
+            self._resize(guild_id, record.size)
+
+            self._evict()
+
+    def pop(self, guild_id: int, message_id: int) -> Optional[StoredMessage]:
+        """Remove a message from the store, returning it if it was stored."""
+        if not (messages := self.guilds.get(guild_id)):
+            return None
+
+        if record := messages.pop(message_id, None):
+            self._resize(guild_id, -record.size)
+
+            if not messages:
+                self._remove_guild(guild_id)
+
+        return record
+
+    def _resize(self, guild_id: int, delta: int) -> None:
+        self.size += delta
+        self.guild_sizes[guild_id] = self.guild_sizes.get(guild_id, 0) + delta
+
+    def _remove_guild(self, guild_id: int) -> None:
+        self.size -= self.guild_sizes.pop(guild_id, 0)
+        self.guilds.pop(guild_id, None)
+        self.hot.pop(guild_id, None)
+
+    def _evict(self) -> None:
+        """Evict the oldest messages of the largest guilds until under the low water mark."""
+        if self.size <= self.budget:
+            return
+
+        target = self.budget * LOW_WATER_MARK
+        largest = [(-size, guild_id) for guild_id, size in self.guild_sizes.items()]
+        heapify(largest)
+
+        while self.size > target and largest:
+            _, guild_id = heappop(largest)
+            messages = self.guilds[guild_id]
+            next_size = -largest[0][0] if largest else 0
+
+            # Trim the guild until it isn't the largest anymore
+            while messages and self.size > target and self.guild_sizes[guild_id] >= next_size:
+                _, record = messages.popitem(last=False)
+                self._resize(guild_id, -record.size)
+
+            if messages:
+                heappush(largest, (-self.guild_sizes[guild_id], guild_id))
+            else:
+                self._remove_guild(guild_id)
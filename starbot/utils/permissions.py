@@ -0,0 +1,100 @@
+from typing import Iterable, NamedTuple, Optional, Protocol
+
+from disnake import Permissions
+
+# Name of the permission stored in each bit, aliases excluded
+PERMISSION_NAMES: dict[int, str] = {
+    Permissions.VALID_FLAGS[name]: name for name, _ in Permissions.all()
+}
+
+EMPTY_OVERWRITE = (0, 0)
+
+
+class RawOverwrite(Protocol):
+    """A permission overwrite as sent by Discord, such as those of `GuildChannel._overwrites`."""
+
+    id: int
+    allow: int
+    deny: int
+
+
+class PermissionChange(NamedTuple):
+    """
+    A single permission which changed.
+
+    For overwrites, None means that the permission is neither allowed nor denied.
+    """
+
+    name: str
+    before: Optional[bool]
+    after: Optional[bool]
+
+
+def _bits(value: int) -> list[int]:
+    """Return each bit set in the value, lowest first."""
+    bits = []
+
+    while value:
+        bit = value & -value
+        bits.append(bit)
+        value ^= bit
+
+    return bits
+
+
+def _name(bit: int) -> str:
+    # Permissions recently added by Discord may not be known by disnake yet
+    return PERMISSION_NAMES.get(bit) or f"unknown_{bit.bit_length() - 1}"
+
+
+def diff_permissions(before: int, after: int) -> list[PermissionChange]:
+    """Return the changes between two raw permission values."""
+    return [
+        PermissionChange(_name(bit), bool(before & bit), bool(after & bit))
+        for bit in _bits(before ^ after)
+    ]
+
+
+def _state(allow: int, deny: int, bit: int) -> Optional[bool]:
+    if allow & bit:
+        return True
+    if deny & bit:
+        return False
+    return None
+
+
+def diff_overwrite(before: tuple[int, int], after: tuple[int, int]) -> list[PermissionChange]:
+    """Return the changes between two raw (allow, deny) overwrite pairs."""
+    (allow_before, deny_before), (allow_after, deny_after) = before, after
+
+    return [
+        PermissionChange(
+            _name(bit),
+            _state(allow_before, deny_before, bit),
+            _state(allow_after, deny_after, bit),
+        )
+        for bit in _bits((allow_before ^ allow_after) | (deny_before ^ deny_after))
+    ]
+
+
+def diff_overwrites(
+    before: Iterable[RawOverwrite], after: Iterable[RawOverwrite]
+) -> dict[int, list[PermissionChange]]:
+    """Return the changes of every target ID whose overwrite was added, edited or removed."""
+    pairs_before = {overwrite.id: (overwrite.allow, overwrite.deny) for overwrite in before}
+    changes = {}
+
+    for overwrite in after:
+        allow_before, deny_before = pairs_before.pop(overwrite.id, EMPTY_OVERWRITE)
+
+        if (allow_before ^ overwrite.allow) | (deny_before ^ overwrite.deny):
+            changes[overwrite.id] = diff_overwrite(
+                (allow_before, deny_before), (overwrite.allow, overwrite.deny)
+            )
+
+    # The remaining overwrites were removed
+    for target_id, pair_before in pairs_before.items():
+        if pair_before != EMPTY_OVERWRITE:
+            changes[target_id] = diff_overwrite(pair_before, EMPTY_OVERWRITE)
+
+    return changes
@@ -1,10 +1,137 @@
-from starbot.bot import StarBot
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from aiohttp import ClientError, ClientSession, ClientTimeout
+from disnake import Message
+
+from starbot.utils.cache import LRUCache
 
 BASE_ENDPOINT = "https://api.pluralkit.me/v2"
 MESSAGE_ENDPOINT = BASE_ENDPOINT + "/messages/{message_id}"
 
+PLURALKIT_USER_ID = 466378653216014359
+
+# PluralKit deletes the original message right after proxying it
+PROXY_WINDOW = timedelta(seconds=30)
+# Time given to PluralKit to register the proxied message, also used to merge duplicate lookups
+DEBOUNCE_DELAY = 0.5
+REQUEST_TIMEOUT = ClientTimeout(total=3)
+
+CACHE_SIZE = 1024
+CACHE_TTL = 10 * 60
+
+# Number of consecutive failures opening the circuit, and seconds before trying again
+FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_AFTER = 60
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """Skip calls to a failing service until `reset_after` seconds have passed."""
+
+    def __init__(self, threshold: int, reset_after: float) -> None:
+        self.threshold = threshold
+        self.reset_after = reset_after
+
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        """Whether calls should be skipped."""
+        if self.opened_at is None:
+            return False
+        return time.monotonic() - self.opened_at < self.reset_after
+
+    def record_success(self) -> None:
+        """Close the circuit."""
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        """Open the circuit after too many consecutive failures."""
+        self.failures += 1
+
+        if self.failures >= self.threshold:
+            if self.opened_at is None:
+                logger.warning("Too many failures, opening the circuit.")
+            self.opened_at = time.monotonic()
+
+
+class PluralKitClient:
+    """
+    Find out whether a deleted message has been proxied by PluralKit.
+
+    Only messages that could plausibly be a proxy trigger a lookup. Results are cached,
+    concurrent lookups of the same message are merged, and lookups are skipped entirely
+    while the API is failing.
+    """
+
+    def __init__(self, session: ClientSession) -> None:
+        self.session = session
+        self.cache: LRUCache[int, bool] = LRUCache(CACHE_SIZE, CACHE_TTL)
+        self.pending: dict[int, asyncio.Future] = {}
+        self.breaker = CircuitBreaker(FAILURE_THRESHOLD, CIRCUIT_RESET_AFTER)
+
+    @staticmethod
+    def could_be_proxied(message: Message) -> bool:
+        """Return whether the message could have been deleted by PluralKit."""
+        if message.author.bot or message.guild is None:
+            return False
+
+        if datetime.now(timezone.utc) - message.created_at > PROXY_WINDOW:
+            return False
+
+        return message.guild.get_member(PLURALKIT_USER_ID) is not None
+
+    async def is_deleted_by_pluralkit(self, message: Message) -> bool:
+        """Return true if the message has been deleted by PluralKit."""
+        if not self.could_be_proxied(message):
+            return False
+
+        if (cached := self.cache.get(message.id)) is not None:
+            return cached
+
+        if future := self.pending.get(message.id):
+            return await asyncio.shield(future)
+
+        if self.breaker.is_open:
+            logger.debug(f"Skipping PluralKit lookup of {message.id}, the circuit is open.")
+            return False
+
+        future = self.pending[message.id] = asyncio.get_running_loop().create_future()
+
+        try:
+            result = await self._fetch(message.id)
+            future.set_result(result)
+            return result
+        finally:
+            del self.pending[message.id]
+
+            if not future.done():
+                future.set_result(False)
+
+    async def _fetch(self, message_id: int) -> bool:
+        """Query the API, returning False if it couldn't be reached."""
+        await asyncio.sleep(DEBOUNCE_DELAY)
+
+        try:
+            async with self.session.get(
+                MESSAGE_ENDPOINT.format(message_id=message_id), timeout=REQUEST_TIMEOUT
+            ) as response:
+                if response.status == 429 or response.status >= 500:
+                    raise ClientError(f"PluralKit API returned status {response.status}")
+
+                result = response.status == 200
+        except (ClientError, asyncio.TimeoutError) as e:
+            logger.debug(f"PluralKit lookup of {message_id} failed: {e!r}")
+            self.breaker.record_failure()
+            return False
 
-async def is_deleted_by_pluralkit(bot: StarBot, message_id: int) -> bool:
-    """Return true if the message has been deleted by PluralKit."""
-    async with bot.aiohttp.get(MESSAGE_ENDPOINT.format(message_id=message_id)) as response:
-        return response.status == 200
+        self.breaker.record_success()
+        self.cache.set(message_id, result)
+        return result
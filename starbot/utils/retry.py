@@ -0,0 +1,41 @@
+import asyncio
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from disnake import HTTPException
+
+T = TypeVar("T")
+
+MAX_RETRIES = 3
+RETRY_BASE_DELAY = 2
+
+
+def is_retryable(error: HTTPException) -> bool:
+    """Return whether the request may succeed if tried again, after a rate limit or server error."""
+    return error.status == 429 or error.status >= 500
+
+
+async def retry_http(
+    request: Callable[[], Awaitable[T]],
+    retries: int = MAX_RETRIES,
+    on_retry: Optional[Callable[[], None]] = None,
+) -> T:
+    """
+    Await a new `request()` until it succeeds, backing off exponentially between attempts.
+
+    Only rate limits and server errors are retried, other errors and the error of the last
+    attempt are raised. `on_retry` is called before each new attempt.
+    """
+    attempt = 0
+
+    while True:
+        try:
+            return await request()
+        except HTTPException as e:
+            if attempt == retries or not is_retryable(e):
+                raise
+
+        if on_retry:
+            on_retry()
+
+        await asyncio.sleep(RETRY_BASE_DELAY * 2 ** attempt)
+        attempt += 1
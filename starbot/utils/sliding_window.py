@@ -0,0 +1,49 @@
+import time
+from typing import Optional
+
+
+class SlidingWindowCounter:
+    """
+    Count events over the last `window` seconds, using a ring buffer of one-second buckets.
+
+    Memory is bounded by the window size. Each call only clears the buckets which expired
+    since the previous one, so counting is O(1) amortized.
+    """
+
+    __slots__ = ("window", "buckets", "current", "total")
+
+    def __init__(self, window: int) -> None:
+        self.window = window
+        self.buckets = [0] * window
+        self.current = 0
+        self.total = 0
+
+    def _advance(self, now: int) -> None:
+        """Clear the buckets of the seconds which left the window."""
+        if now <= self.current:
+            return
+
+        if now - self.current >= self.window:
+            self.buckets = [0] * self.window
+            self.total = 0
+        else:
+            for second in range(self.current + 1, now + 1):
+                index = second % self.window
+                self.total -= self.buckets[index]
+                self.buckets[index] = 0
+
+        self.current = now
+
+    def add(self, amount: int = 1, now: Optional[int] = None) -> int:
+        """Count new events, returning the number of events within the window."""
+        now = int(time.monotonic()) if now is None else now
+        self._advance(now)
+
+        self.buckets[now % self.window] += amount
+        self.total += amount
+        return self.total
+
+    def count(self, now: Optional[int] = None) -> int:
+        """Return the number of events within the window."""
+        self._advance(int(time.monotonic()) if now is None else now)
+        return self.total
@@ -0,0 +1,70 @@
+import asyncio
+import logging
+from typing import Iterable, Optional
+
+from disnake import HTTPException, NotFound, User
+
+from starbot.bot import StarBot
+from starbot.utils.cache import LRUCache
+
+# Number of users fetched from the API at once
+FETCH_CONCURRENCY = 5
+
+MAX_USERS = 5000
+USER_TTL = 60 * 60
+
+logger = logging.getLogger(__name__)
+
+
+class UserResolver:
+    """
+    Resolve user IDs in batches.
+
+    Users are looked up in the bot cache first, then in a cache of previously fetched users.
+    The remaining ones are fetched from the API concurrently, up to `concurrency` at once.
+    Users which don't exist are cached too, so they aren't fetched again.
+    """
+
+    def __init__(
+        self,
+        bot: StarBot,
+        concurrency: int = FETCH_CONCURRENCY,
+        maxsize: int = MAX_USERS,
+        ttl: float = USER_TTL,
+    ) -> None:
+        self.bot = bot
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.cache: LRUCache[int, Optional[User]] = LRUCache(maxsize, ttl)
+
+    async def resolve(self, user_ids: Iterable[int]) -> dict[int, Optional[User]]:
+        """Return the user of each distinct ID, None for those who couldn't be resolved."""
+        users = {}
+        missing = []
+
+        for user_id in set(user_ids):
+            if user := self.bot.get_user(user_id):
+                users[user_id] = user
+            elif user_id in self.cache:
+                users[user_id] = self.cache.get(user_id)
+            else:
+                missing.append(user_id)
+
+        if missing:
+            fetched = await asyncio.gather(*(self._fetch(user_id) for user_id in missing))
+            users.update(zip(missing, fetched))
+
+        return users
+
+    async def _fetch(self, user_id: int) -> Optional[User]:
+        async with self.semaphore:
+            try:
+                user = await self.bot.fetch_user(user_id)
+            except NotFound:
+                user = None
+            except HTTPException as e:
+                # Don't cache transient errors
+                logger.debug(f"Couldn't fetch user {user_id}: {e}")
+                return None
+
+        self.cache.set(user_id, user)
+        return user
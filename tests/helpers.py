@@ -0,0 +1,26 @@
+import asyncio
+import time
+from typing import Callable
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+
+async def start_server(*routes: web.RouteDef) -> TestServer:
+    """Start a local HTTP server standing in for an external API."""
+    app = web.Application()
+    app.add_routes(routes)
+
+    server = TestServer(app)
+    await server.start_server()
+    return server
+
+
+async def wait_until(predicate: Callable[[], bool], timeout: float = 5) -> None:
+    """Wait for the predicate to become true, failing after `timeout` seconds."""
+    deadline = time.monotonic() + timeout
+
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("Condition not met in time.")
+        await asyncio.sleep(0.01)
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import time
+import unittest
+from typing import Callable
+from unittest.mock import patch
+
+from aiohttp import ClientSession, web
+
+from starbot.modules.filters import _phishing_feed
+from starbot.modules.filters._phishing_feed import RESYNC_THRESHOLD, PhishingFeed
+from tests.helpers import start_server, wait_until
+
+
+class PhishingFeedTests(unittest.IsolatedAsyncioTestCase):
+    """Drive the feed against a local stand-in of the SinkingYachts API."""
+
+    async def asyncSetUp(self) -> None:
+        self.full_list = ["scam.com", "phish.net"]
+        self.list_failures = 0
+        self.list_requests = 0
+        # Messages sent through the first websocket connection, before closing it
+        self.frames: list[str] = []
+        self.connections = 0
+
+        self.server = await start_server(
+            web.get("/all", self.handle_all), web.get("/feed", self.handle_feed)
+        )
+        self.session = ClientSession()
+
+        for name, value in (
+            ("API_ALL", str(self.server.make_url("/all"))),
+            ("API_WS", str(self.server.make_url("/feed")).replace("http", "ws", 1)),
+            ("BACKOFF_BASE", 0.01),
+            ("RESYNC_RETRY_BASE", 0),
+        ):
+            patcher = patch.object(_phishing_feed, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def asyncTearDown(self) -> None:
+        await self.session.close()
+        await self.server.close()
+
+    async def handle_all(self, request: web.Request) -> web.Response:
+        self.list_requests += 1
+
+        if self.list_failures:
+            self.list_failures -= 1
+            return web.Response(status=503)
+
+        return web.json_response(self.full_list)
+
+    async def handle_feed(self, request: web.Request) -> web.WebSocketResponse:
+        self.connections += 1
+
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        if self.connections == 1:
+            for frame in self.frames:
+                await ws.send_str(frame)
+
+        await ws.close()
+        return ws
+
+    async def run_feed(self, feed: PhishingFeed, until: Callable[[], bool]) -> None:
+        """Run the feed until the condition is met."""
+        task = asyncio.create_task(feed.run())
+
+        try:
+            await wait_until(until)
+        finally:
+            # Before Python 3.12, `wait_for` may swallow a cancellation racing with its result
+            while not task.done():
+                task.cancel()
+                await asyncio.wait([task], timeout=0.1)
+
+    async def test_resync_diffs_the_full_list(self) -> None:
+        """A resync adds the new domains and removes the stale ones."""
+        feed = PhishingFeed(self.session, {})
+        feed.domains.update({"scam.com", "removed.org"})
+
+        self.assertTrue(await feed.resync())
+
+        self.assertEqual(feed.domains, {"scam.com", "phish.net"})
+        self.assertTrue(feed.ready)
+        self.assertFalse(feed.needs_resync)
+
+    async def test_failed_resync_is_retried(self) -> None:
+        """A failed resync is retried in the background, without waiting for a reconnection."""
+        self.list_failures = 2
+        feed = PhishingFeed(self.session, {})
+
+        feed.request_resync()
+        await asyncio.wait_for(feed._resync_task, timeout=5)
+
+        self.assertEqual(self.list_requests, 3)
+        self.assertEqual(feed.domains, set(self.full_list))
+        self.assertTrue(feed.ready)
+
+    async def test_messages_are_applied(self) -> None:
+        """Changes received through the websocket are applied to the set."""
+        self.frames = [
+            json.dumps({"type": "add", "domains": ["new.com", "other.com"]}),
+            json.dumps({"type": "delete", "domains": ["other.com"]}),
+        ]
+        feed = PhishingFeed(self.session, {}, full_resync=False)
+
+        await self.run_feed(feed, lambda: feed.domains == {"new.com"})
+
+        self.assertIsNotNone(feed.last_update)
+
+    async def test_malformed_messages_are_skipped(self) -> None:
+        """Malformed messages are logged and skipped, without ending the feed."""
+        self.frames = [
+            "not json",
+            json.dumps({"type": "add"}),
+            json.dumps(["add"]),
+            json.dumps({"type": "add", "domains": ["new.com"]}),
+        ]
+        feed = PhishingFeed(self.session, {}, full_resync=False)
+
+        with self.assertLogs(_phishing_feed.logger, "WARNING") as logs:
+            await self.run_feed(feed, lambda: "new.com" in feed.domains)
+
+        self.assertEqual(len(logs.records), 3)
+        self.assertEqual(feed.domains, {"new.com"})
+
+    async def test_reconnects_with_backoff(self) -> None:
+        """Short lived connections are retried, counting the consecutive failures."""
+        feed = PhishingFeed(self.session, {}, full_resync=False)
+
+        await self.run_feed(feed, lambda: feed.failed_attempts >= 3)
+
+        self.assertGreaterEqual(self.connections, 3)
+        self.assertGreaterEqual(feed.reconnections, 3)
+
+    async def test_long_disconnection_triggers_resync(self) -> None:
+        """Reconnecting after missing changes for too long resyncs against the full list."""
+        feed = PhishingFeed(self.session, {})
+        feed.needs_resync = False
+        feed.disconnected_since = time.monotonic() - RESYNC_THRESHOLD - 1
+
+        feed._on_connect()
+        await asyncio.wait_for(feed._resync_task, timeout=5)
+
+        self.assertEqual(feed.resyncs, 1)
+        self.assertEqual(feed.domains, set(self.full_list))
+
+    async def test_short_disconnection_skips_resync(self) -> None:
+        """Reconnecting right away doesn't fetch the full list again."""
+        feed = PhishingFeed(self.session, {})
+        feed.needs_resync = False
+        feed.disconnected_since = time.monotonic()
+
+        feed._on_connect()
+
+        self.assertIsNone(feed._resync_task)
+        self.assertEqual(self.list_requests, 0)
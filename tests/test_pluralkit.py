@@ -0,0 +1,106 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from aiohttp import ClientSession, web
+
+from starbot.utils import pluralkit
+from starbot.utils.pluralkit import FAILURE_THRESHOLD, PluralKitClient
+from tests.helpers import start_server
+
+
+class PluralKitClientTests(unittest.IsolatedAsyncioTestCase):
+    """Drive the client against a local stand-in of the PluralKit API."""
+
+    async def asyncSetUp(self) -> None:
+        self.status = 200
+        self.requests = 0
+
+        self.server = await start_server(web.get("/messages/{message_id}", self.handle_message))
+        self.session = ClientSession()
+
+        for name, value in (
+            ("MESSAGE_ENDPOINT", str(self.server.make_url("/messages/")) + "{message_id}"),
+            ("DEBOUNCE_DELAY", 0),
+        ):
+            patcher = patch.object(pluralkit, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        # Every message is eligible, the lookups are what's under test
+        patcher = patch.object(PluralKitClient, "could_be_proxied", return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.client = PluralKitClient(self.session)
+
+    async def asyncTearDown(self) -> None:
+        await self.session.close()
+        await self.server.close()
+
+    async def handle_message(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        return web.json_response({}, status=self.status)
+
+    async def lookup(self, message_id: int) -> bool:
+        return await self.client.is_deleted_by_pluralkit(SimpleNamespace(id=message_id))
+
+    async def test_proxied_message(self) -> None:
+        """A message known to PluralKit has been deleted by it."""
+        self.assertTrue(await self.lookup(1))
+
+    async def test_unknown_message(self) -> None:
+        """A message unknown to PluralKit hasn't been deleted by it."""
+        self.status = 404
+
+        self.assertFalse(await self.lookup(1))
+        self.assertEqual(self.client.breaker.failures, 0)
+
+    async def test_results_are_cached(self) -> None:
+        """Looking up the same message again doesn't query the API."""
+        await self.lookup(1)
+        self.assertTrue(await self.lookup(1))
+
+        self.assertEqual(self.requests, 1)
+
+    async def test_concurrent_lookups_are_merged(self) -> None:
+        """Concurrent lookups of the same message share a single request."""
+        results = await asyncio.gather(*(self.lookup(1) for _ in range(5)))
+
+        self.assertEqual(results, [True] * 5)
+        self.assertEqual(self.requests, 1)
+
+    async def test_circuit_opens_after_failures(self) -> None:
+        """Lookups are skipped once the API failed too many times in a row."""
+        self.status = 503
+
+        for message_id in range(FAILURE_THRESHOLD):
+            self.assertFalse(await self.lookup(message_id))
+
+        self.assertTrue(self.client.breaker.is_open)
+
+        self.status = 200
+        self.assertFalse(await self.lookup(FAILURE_THRESHOLD))
+        self.assertEqual(self.requests, FAILURE_THRESHOLD)
+
+    async def test_rate_limits_count_as_failures(self) -> None:
+        """Being rate limited counts towards opening the circuit."""
+        self.status = 429
+
+        self.assertFalse(await self.lookup(1))
+        self.assertEqual(self.client.breaker.failures, 1)
+
+    async def test_circuit_closes_after_reset(self) -> None:
+        """The API is tried again once the circuit reset delay passed, closing it on success."""
+        self.status = 503
+        self.client.breaker.reset_after = 0
+
+        for message_id in range(FAILURE_THRESHOLD):
+            await self.lookup(message_id)
+
+        self.status = 200
+        self.assertTrue(await self.lookup(FAILURE_THRESHOLD))
+
+        self.assertFalse(self.client.breaker.is_open)
+        self.assertEqual(self.client.breaker.failures, 0)
@@ -0,0 +1,273 @@
+#! /usr/bin/env python
+"""
+Benchmark the phishing link detection against a generated corpus.
+
+The corpus mixes benign chat, long code blocks, messages full of legitimate links and
+obfuscated phishing links. It is generated from a fixed seed, so runs are comparable.
+The real extraction and matching code is used, without any network access.
+
+Throughput depends on the machine, so it is only reported. Regressions are checked against
+the speedup over a naive matcher timed in the same run, and the precision and recall.
+
+Usage:
+    python tools/benchmark_phishing.py           Compare the results against the baseline
+    python tools/benchmark_phishing.py --save    Store the results as the new baseline
+"""
+import argparse
+import json
+import random
+import string
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from starbot.utils.domains import DomainMatcher  # noqa: E402
+
+BASELINE_FILE = Path(__file__).parent / "benchmark_phishing_baseline.json"
+
+SEED = 42
+PHISHING_DOMAINS = 20_000  # Roughly the size of the SinkingYachts list
+MESSAGES_PER_CATEGORY = 2_000
+ROUNDS = 5
+# The naive matcher is slow, only time it on every nth message
+NAIVE_SAMPLE_STEP = 16
+
+# Relative drop of the speedup over the naive matcher reported as a regression
+SPEEDUP_TOLERANCE = 0.25
+
+BENIGN_DOMAINS = (
+    "discord.com",
+    "github.com",
+    "youtube.com",
+    "docs.python.org",
+    "en.wikipedia.org",
+    "stackoverflow.com",
+    "store.steampowered.com",
+    "twitter.com",
+    "pypi.org",
+    "reddit.com",
+)
+PHISHING_WORDS = ("discord", "nitro", "steam", "gift", "free", "community", "airdrop", "promo")
+PHISHING_TLDS = ("com", "ru", "gift", "xyz", "net", "org", "link", "click")
+
+WORDS = (
+    "hey what is up did anyone see the new update yesterday I think it broke my setup "
+    "lol same here can you send the file again thanks that works now good night everyone"
+).split()
+CODE_LINES = (
+    "def handler(event: dict) -> None:",
+    "    config = load_config(path.resolve())",
+    "    for key, value in sorted(config.items()):",
+    "        logger.debug(f'{key}={value!r}')",
+    "    return self.session.execute(query.where(Model.id == 1))",
+    "const result = await client.fetch(url, { method: 'POST' });",
+    "SELECT guild.id, count(*) FROM infraction GROUP BY guild.id;",
+    "import os.path; os.path.join(base_dir, 'static', 'index.html')",
+)
+
+
+def _generate_domains(rng: random.Random) -> list[str]:
+    """Generate a list of plausible phishing domains."""
+    domains = set()
+
+    while len(domains) < PHISHING_DOMAINS:
+        words = rng.sample(PHISHING_WORDS, rng.randint(1, 3))
+        suffix = "".join(rng.choices(string.ascii_lowercase + string.digits, k=rng.randint(0, 4)))
+        domain = f"{'-'.join(words)}{suffix}.{rng.choice(PHISHING_TLDS)}"
+
+        if domain not in BENIGN_DOMAINS:
+            domains.add(domain)
+
+    return sorted(domains)
+
+
+def _chat(rng: random.Random, length: int) -> str:
+    return " ".join(rng.choices(WORDS, k=length))
+
+
+def _benign_chat(rng: random.Random, _domains: list[str]) -> tuple[str, bool]:
+    return _chat(rng, rng.randint(3, 40)), False
+
+
+def _code_block(rng: random.Random, _domains: list[str]) -> tuple[str, bool]:
+    lines = rng.choices(CODE_LINES, k=rng.randint(20, 80))
+    return "```py\n" + "\n".join(lines) + "\n```", False
+
+
+def _url_heavy(rng: random.Random, _domains: list[str]) -> tuple[str, bool]:
+    links = (
+        f"https://{rng.choice(BENIGN_DOMAINS)}/{_chat(rng, 2).replace(' ', '/')}"
+        for _ in range(rng.randint(3, 15))
+    )
+    return " ".join(links), False
+
+
+def _phishing(rng: random.Random, domains: list[str]) -> tuple[str, bool]:
+    domain = rng.choice(domains)
+    path = "/" + "".join(rng.choices(string.ascii_lowercase, k=8))
+
+    obfuscations = (
+        f"https://{domain}{path}",
+        f"<https://{domain}{path}>",
+        f"[https://discord.com/gifts]({'https://' + domain + path})",
+        f"https://{domain.upper()}{path}",
+        f"https://discord.com@{domain}{path}",
+        f"{domain}{path}",
+        f"**https://{domain}**",
+        f"||https://{domain}{path}||",
+        f"https://{domain}.{path}",
+        f"https://www.{domain}{path}",
+        f"https://login.{domain}{path}",
+    )
+    return f"{_chat(rng, rng.randint(2, 10))} {rng.choice(obfuscations)} {_chat(rng, 3)}", True
+
+
+CATEGORIES = {
+    "benign_chat": _benign_chat,
+    "code_blocks": _code_block,
+    "url_heavy": _url_heavy,
+    "phishing": _phishing,
+}
+
+
+def generate_corpus() -> tuple[list[str], dict[str, list[tuple[str, bool]]]]:
+    """Generate the phishing domains and the labelled messages of each category."""
+    rng = random.Random(SEED)
+    domains = _generate_domains(rng)
+
+    corpus = {
+        name: [generator(rng, domains) for _ in range(MESSAGES_PER_CATEGORY)]
+        for name, generator in CATEGORIES.items()
+    }
+    return domains, corpus
+
+
+def _percentile(values: list[int], percentile: float) -> int:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percentile))]
+
+
+def _naive_find(text: str, domains: list[str]) -> Optional[str]:
+    """Reference matcher, looking for every listed domain in the text."""
+    text = text.lower()
+
+    for domain in domains:
+        if domain in text:
+            return domain
+    return None
+
+
+def _best_round(messages: list[str], find: Callable[[str], object], rounds: int) -> float:
+    """Return the time taken by the fastest round over all the messages."""
+    best_round = float("inf")
+
+    for _ in range(rounds):
+        round_start = time.perf_counter()
+
+        for text in messages:
+            find(text)
+
+        best_round = min(best_round, time.perf_counter() - round_start)
+
+    return best_round
+
+
+def run() -> dict:
+    """Run the benchmark and return the results."""
+    domains, corpus = generate_corpus()
+    matcher = DomainMatcher(set(domains))
+
+    messages = [text for category in corpus.values() for text, _ in category]
+    latencies = []
+    best_round = float("inf")
+
+    # Keep the fastest round, as it is the least disturbed by the rest of the system
+    for _ in range(ROUNDS):
+        round_start = time.perf_counter()
+
+        for text in messages:
+            message_start = time.perf_counter_ns()
+            matcher.find(text)
+            latencies.append(time.perf_counter_ns() - message_start)
+
+        best_round = min(best_round, time.perf_counter() - round_start)
+
+    sample = messages[::NAIVE_SAMPLE_STEP]
+    naive_time = _best_round(sample, lambda text: _naive_find(text, domains), 1)
+    matcher_time = _best_round(sample, matcher.find, ROUNDS)
+
+    results = {
+        "messages_per_second": round(len(messages) / best_round),
+        "p99_latency_us": round(_percentile(latencies, 0.99) / 1000, 2),
+        "speedup_over_naive": round(naive_time / matcher_time, 1),
+        "categories": {},
+    }
+
+    true_positives = false_positives = false_negatives = 0
+
+    for name, category in corpus.items():
+        detected = 0
+
+        for text, is_phishing in category:
+            found = matcher.find(text) is not None
+            detected += found
+
+            true_positives += found and is_phishing
+            false_positives += found and not is_phishing
+            false_negatives += not found and is_phishing
+
+        results["categories"][name] = {"detection_rate": round(detected / len(category), 4)}
+
+    results["precision"] = round(true_positives / ((true_positives + false_positives) or 1), 4)
+    results["recall"] = round(true_positives / ((true_positives + false_negatives) or 1), 4)
+
+    return results
+
+
+def compare(results: dict, baseline: dict) -> bool:
+    """Print the results next to the baseline, returning False if they regressed."""
+    ok = True
+
+    for key in ("messages_per_second", "p99_latency_us"):
+        print(f"{key:>20}: {results[key]:>12} (baseline {baseline[key]}, not compared)")
+
+    for key in ("speedup_over_naive", "precision", "recall"):
+        delta = results[key] - baseline[key]
+        print(f"{key:>20}: {results[key]:>12} (baseline {baseline[key]}, {delta:+.4g})")
+
+        if key in ("precision", "recall") and delta < 0:
+            ok = False
+        if key == "speedup_over_naive" and delta < -baseline[key] * SPEEDUP_TOLERANCE:
+            ok = False
+
+    for name, category in results["categories"].items():
+        before = baseline["categories"].get(name, {}).get("detection_rate")
+        print(f"{name:>20}: detection rate {category['detection_rate']} (baseline {before})")
+
+    return ok
+
+
+def main() -> None:
+    """Run the benchmark, then save it or compare it against the baseline."""
+    parser = argparse.ArgumentParser(description="Benchmark the phishing link detection.")
+    parser.add_argument("--save", action="store_true", help="store the results as the baseline")
+    args = parser.parse_args()
+
+    results = run()
+
+    if args.save or not BASELINE_FILE.exists():
+        BASELINE_FILE.write_text(json.dumps(results, indent=4) + "\n")
+        print(json.dumps(results, indent=4))
+        print(f"Wrote baseline to {BASELINE_FILE}")
+        return
+
+    if not compare(results, json.loads(BASELINE_FILE.read_text())):
+        print("Phishing detection regressed compared to the baseline.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()